@@ -0,0 +1,222 @@
+'''
+salesmanBatch.py
+Batch and service mode for simAnnealingSalesmanOptimization.py
+'''
+
+import argparse
+import csv
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+
+import numpy as np
+
+import simAnnealingSalesmanOptimization as sa
+
+"""
+Settings used for any instance that does not give its own. The air and car parameters are those of scenario 1.
+With "iterations": "auto", an instance of n points runs iterationsPerPoint * n iterations (at least minimumIterations),
+so large instances get enough moves to improve on their greedy starting tour.
+"""
+
+iterationsPerPoint = 20
+minimumIterations = 20000
+
+instanceDefaults = {"objective": "distance", "airSpeed": 600, "airCriteria": 300, "airCost": 10.0, "carSpeed": 60, "carCost": 1,
+                    "iterations": "auto", "T": "auto", "rate": "auto", "moves": {"2opt": 0.7, "oropt": 0.3}, "neighbors": 8,
+                    "initial": "greedy", "seed": None, "timeout": None, "metric": "planar", "deadline": None}
+
+"""
+The following functions read routing instances. An instance is a dictionary with an "id", the coordinate "points"
+(a n by 2 list), and any of the settings in instanceDefaults.
+
+readJsonl: one JSON instance per line
+readCsvStream: one point per row with columns id, x, y (or id, latitude, longitude), and optionally any instanceDefaults
+setting as a column; consecutive rows with the same id make up one instance and settings are taken from its first row
+readDirectory: every .json file (one instance) and .csv coordinate file (such as us-state-capitals.csv) in a folder,
+with the file name as the id
+readInstances: picks the reader from the source ("-" for JSONL on standard input)
+
+INPUT
+source: file, folder, or open text stream
+
+OUTPUT
+instances: generator of instance dictionaries, read one at a time so a large stream is never held in memory
+"""
+
+def readJsonl(stream):
+    for number, line in enumerate(stream):
+        line = line.strip()
+        if line:
+            instance = json.loads(line)
+            instance.setdefault("id", number)
+            yield instance
+
+def settingValue(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def readCsvStream(stream):
+    reader = csv.DictReader(stream)
+    first, second = [reader.fieldnames[k] for k in sa.coordinateColumns(reader.fieldnames)]
+    instance = None
+    for row in reader:
+        if instance is None or row["id"] != instance["id"]:
+            if instance is not None:
+                yield instance
+            instance = {"id": row["id"], "points": []}
+            for key in instanceDefaults:
+                if row.get(key) not in (None, ""):
+                    instance[key] = settingValue(row[key])
+        instance["points"].append([float(row[first]), float(row[second])])
+    if instance is not None:
+        yield instance
+
+def readDirectory(folder):
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.endswith(".json"):
+            with open(path) as file:
+                instance = json.load(file)
+            instance.setdefault("id", name[:-5])
+            yield instance
+        elif name.endswith(".csv"):
+            yield {"id": name[:-4], "points": sa.loadCoordinates(path, cacheDirectory = None)[0]} #Parsed without writing a .salesman_cache folder into the working directory
+
+def readInstances(source):
+    if source == "-":
+        yield from readJsonl(sys.stdin)
+    elif os.path.isdir(source):
+        yield from readDirectory(source)
+    elif source.endswith(".csv"):
+        with open(source, newline = "") as file:
+            yield from readCsvStream(file)
+    else:
+        with open(source) as file:
+            yield from readJsonl(file)
+
+"""
+solveInstance is used to solve one routing instance with annealTour, using the instance's own settings.
+Instances of up to exactLimit points are solved exactly with heldKarp instead of annealed.
+An instance with a "deadline" (milliseconds) fits its cooling schedule to that time and returns its best route when it runs
+out, which is the better choice than a timeout when a route is always needed.
+With a cache, a seeded instance whose points and settings were solved before is answered from the cache (with "cached": true).
+Instances without a seed are always solved, since each unseeded run is meant to be an independent random run.
+
+INPUTS
+instance: instance dictionary
+cache: optional ResultCache
+
+OUTPUT
+result: dictionary with the id, objective, best value, best tour (point indices in visiting order), and the solve time
+"""
+
+def solveInstance(instance, cache = None):
+    settings = dict(instanceDefaults)
+    settings.update({key: value for key, value in instance.items() if key in instanceDefaults})
+    points = np.asarray(instance["points"], dtype = float)
+    start = time.perf_counter()
+    iterations = max(minimumIterations, iterationsPerPoint * len(points)) if settings["iterations"] in (None, "auto") else int(settings["iterations"])
+    initial = settings["initial"] if settings["initial"] is None or isinstance(settings["initial"], str) else np.asarray(settings["initial"])
+    stats = {}
+    tour, bestValue, _ = sa.annealTour(points, settings["T"], settings["rate"], iterations, settings["airSpeed"],
+                                       settings["airCriteria"], settings["airCost"], settings["carSpeed"], settings["carCost"],
+                                       settings["objective"], moves = settings["moves"], neighbors = settings["neighbors"], stats = stats,
+                                       initial = initial, trace = sa.ConvergenceTrace(iterations, mode = "improve"),
+                                       metric = settings["metric"], deadline = settings["deadline"], cache = cache, rng = settings["seed"])
+    result = {"id": instance.get("id"), "status": "ok", "objective": settings["objective"], "points": len(points),
+              "bestValue": float(bestValue), "tour": [int(k) for k in tour], "seconds": time.perf_counter() - start}
+    if stats.get("cached"):
+        result["cached"] = True
+    return result
+
+def solveWorker(instance, connection, cacheDirectory = None):
+    try:
+        connection.send(solveInstance(instance, None if cacheDirectory is None else sa.ResultCache(cacheDirectory)))
+    except Exception as error:
+        connection.send({"id": instance.get("id"), "status": "error", "error": "%s: %s" %(type(error).__name__, error)})
+    finally:
+        connection.close()
+
+"""
+solveBatch is used to solve a stream of instances concurrently and hand back each result as soon as it finishes
+(so results can come back in a different order than the instances).
+Each instance is solved in its own worker process, with at most workers running at once. The next instance is only read
+from the stream when a worker is free, so a long or endless stream is never read ahead of the workers (backpressure).
+A worker that runs past its instance's timeout (or the batch timeout) is stopped and reported with status "timeout".
+
+INPUTS
+instances: iterable of instance dictionaries (such as readInstances)
+workers: number of instances solved at once, defaults to the CPU count
+timeout: default time limit in seconds for each instance (None for no limit)
+cacheDirectory: optional folder of a ResultCache shared by the workers, so repeated instances are not solved again
+
+OUTPUT
+results: generator of result dictionaries, with status "ok", "timeout", or "error"
+"""
+
+def solveBatch(instances, workers = None, timeout = None, cacheDirectory = None):
+    workers = workers or os.cpu_count() or 1
+    instances = iter(instances)
+    running = {} #Result connection of each running worker, with its process, instance, and deadline
+    exhausted = False
+    while running or not exhausted:
+        while not exhausted and len(running) < workers: #Reading the next instance only when a worker is free
+            try:
+                instance = next(instances)
+            except StopIteration:
+                exhausted = True
+                break
+            receiver, sender = multiprocessing.Pipe(duplex = False)
+            process = multiprocessing.Process(target = solveWorker, args = (instance, sender, cacheDirectory), daemon = True)
+            process.start()
+            sender.close()
+            limit = instance.get("timeout", timeout)
+            running[receiver] = (process, instance, time.monotonic() + limit if limit else None)
+        if not running:
+            break
+
+        deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+        wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        for receiver in multiprocessing.connection.wait(list(running), timeout = wait):
+            process, instance, _ = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError: #The worker died without sending a result
+                result = {"id": instance.get("id"), "status": "error", "error": "worker exited with code %s" %process.exitcode}
+            receiver.close()
+            process.join()
+            yield result
+        now = time.monotonic()
+        for receiver in [receiver for receiver, (_, _, deadline) in running.items() if deadline is not None and deadline <= now]:
+            process, instance, _ = running.pop(receiver)
+            process.terminate()
+            process.join()
+            receiver.close()
+            yield {"id": instance.get("id"), "status": "timeout", "error": "no result within %s seconds" %instance.get("timeout", timeout)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Solve many traveling salesman instances with Simulated Annealing.")
+    parser.add_argument("source", help = "folder of .json/.csv instances, a .jsonl or .csv instance stream, or - for JSONL on standard input")
+    parser.add_argument("--output", help = "JSONL file results are written to as they finish (standard output if not given)")
+    parser.add_argument("--workers", type = int, default = None, help = "instances solved at once (defaults to the CPU count)")
+    parser.add_argument("--timeout", type = float, default = None, help = "time limit in seconds for each instance")
+    parser.add_argument("--include-tour", action = "store_true", help = "include the best tour in each result")
+    parser.add_argument("--cache", help = "folder of stored results, repeated seeded instances are answered from it")
+    args = parser.parse_args()
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in solveBatch(readInstances(args.source), args.workers, args.timeout, args.cache):
+            if not args.include_tour:
+                result.pop("tour", None)
+            output.write(json.dumps(result) + "\n")
+            output.flush() #Streaming each result out as soon as it is ready
+    finally:
+        if output is not sys.stdout:
+            output.close()
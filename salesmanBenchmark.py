@@ -0,0 +1,251 @@
+'''
+salesmanBenchmark.py
+Benchmark suite for simAnnealingSalesmanOptimization.py
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import simAnnealingSalesmanOptimization as sa
+
+"""
+Air and car travel parameters of each benchmark instance, taken from the scenarios in simAnnealingSalesmanOptimization.py
+(airSpeed, airCriteria, airCost, carSpeed, carCost).
+"""
+
+scenarioParameters = {"capitals": (600, 300, 10.0, 60, 1), "circle": (500, 300, 1, 70, 3.0), "uniform": (500, 300, 1, 70, 3.0)}
+
+"""
+benchmarkInstances is used to build the fixed benchmark instances. Every instance is generated from a fixed seed, so the
+same instance is used by every benchmark run.
+
+capitals: the 50 US state capitals of scenario 1 (read from us-state-capitals.csv)
+circle: the 20 points on a circle of scenario 3
+uniform-N: N random points in a 10000 by 10000 square, as in scenario 4
+
+INPUTS
+sizes: sizes of the uniform instances
+seed: seed of the uniform instances
+
+OUTPUT
+instances: list of (name, data, parameters) tuples
+"""
+
+def benchmarkInstances(sizes, seed = 0):
+    here = os.path.dirname(os.path.abspath(__file__))
+    capitals = sa.loadCoordinates(os.path.join(here, "us-state-capitals.csv"))[0]
+    theta = np.linspace(0, 2 * np.pi, 20)
+    circle = np.array([1000 * np.cos(theta), 1000 * np.sin(theta)]).T
+    instances = [("capitals", capitals, scenarioParameters["capitals"]), ("circle", circle, scenarioParameters["circle"])]
+    for size in sizes:
+        rng = np.random.default_rng([seed, size])
+        instances.append(("uniform-%d" %size, rng.uniform(0, 10000, (size, 2)), scenarioParameters["uniform"]))
+    return instances
+
+"""
+benchmarkRun is used to time one annealing run on one instance.
+The schedule is picked with autoSchedule so every instance is run the same way. The chain records each improvement of the
+best value in a ConvergenceTrace, so the first iteration reaching each target is known exactly, and its time is interpolated
+within the chunk of iterations it fell in. The reference length is the greedy edge tour of the instance, scored on the
+benchmarked objective, and a target of 1.05 means reaching 5% above the reference.
+The seeded run is timed repeats times (every repeat makes the same moves) and the median times are reported, so a single
+slow repeat on a busy machine does not show up as a regression.
+Peak memory is measured with tracemalloc in a separate short run, so that tracing does not slow down the timed run.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+parameters: airSpeed, airCriteria, airCost, carSpeed, carCost
+optimizationType: "distance", "time", or "cost"
+moves: move mix (see moveMix)
+iterations: number of iterations
+seed: seed of the run
+targets: fractions of the reference length to time
+chunk: iterations between checks of the best value
+neighbors: nearest neighbor count used by the moves
+repeats: number of timed repeats of the run
+
+OUTPUT
+result: dictionary of measurements
+"""
+
+def benchmarkRun(data, parameters, optimizationType, moves, iterations, seed = 0, targets = (1.1, 1.05, 1.0), chunk = 1000, neighbors = 8,
+                 repeats = 5):
+    airSpeed, airCriteria, airCost, carSpeed, carCost = parameters
+
+    def setup():
+        weights = sa.edgeWeights(data, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType)
+        candidates = sa.nearestNeighbors(weights, neighbors) if neighbors else None
+        return weights, candidates
+
+    start = time.perf_counter()
+    weights, candidates = setup()
+    setupTime = time.perf_counter() - start
+    reference = sa.tourLength(sa.greedyEdgeTour(data), weights)
+
+    def timedRun():
+        rng = np.random.default_rng(seed)
+        state = sa.annealState(weights, 1.0, None, rng)
+        T, rate = sa.autoSchedule(weights, state["tour"], iterations, moves, candidates, rng)
+        state["T"] = state["T0"] = T
+        draws = sa.RandomBlocks(rng)
+        trace = sa.ConvergenceTrace(iterations, mode = "improve")
+        reached = {}
+        start = time.perf_counter()
+        while state["iteration"] < iterations:
+            chunkStart, chunkTime = state["iteration"], time.perf_counter()
+            sa.annealChain(weights, state, rate, min(chunk, iterations - chunkStart), draws, trace, moves = moves, neighbors = candidates)
+            now = time.perf_counter()
+            for target in [target for target in targets if target not in reached]:
+                hits = np.flatnonzero(trace.values <= target * reference)
+                if len(hits):
+                    iteration = int(trace.iterations[hits[0]]) + 1 #Iterations run when the target was first reached
+                    seconds = chunkTime - start + (now - chunkTime) * (iteration - chunkStart) / (state["iteration"] - chunkStart)
+                    reached[target] = {"seconds": seconds, "iterations": iteration}
+        return time.perf_counter() - start, reached, state, T, rate
+
+    runs = [timedRun() for _ in range(repeats)]
+    runTime = statistics.median(run[0] for run in runs)
+    reached = {target: {"seconds": statistics.median(run[1][target]["seconds"] for run in runs), "iterations": runs[0][1][target]["iterations"]}
+               for target in targets if target in runs[0][1]} #Every repeat reaches a target at the same iteration
+    state, T, rate = runs[0][2:]
+
+    tracemalloc.start()
+    weights, candidates = setup()
+    memoryState = sa.annealState(weights, T, None, np.random.default_rng(seed))
+    sa.annealChain(weights, memoryState, rate, min(chunk, iterations), np.random.default_rng(seed), None, moves = moves, neighbors = candidates)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"points": len(data), "objective": optimizationType, "moves": moves, "iterations": iterations,
+            "setupSeconds": setupTime, "runSeconds": runTime, "iterationsPerSecond": iterations / runTime if runTime > 0 else None,
+            "referenceLength": reference, "bestValue": state["bestValue"], "relativeToReference": state["bestValue"] / reference,
+            "timeToTarget": {("%g" %target): reached.get(target) for target in targets}, "peakMemoryBytes": peakMemory}
+
+"""
+temperingCheck is used to check that the tempering mode of parallelAnneal does at least as well as independent restarts
+with the same replicas, iterations, and seeds (tempering that does worse than restarts is a regression, see compareBenchmarks).
+Single runs of either mode differ by about a percent from seed to seed, so the mean best value of several seeded runs is compared.
+
+INPUTS
+size: size of the uniform instance
+iterations: iterations per replica
+replicas: number of replicas
+runs: number of seeded runs of each mode
+seed: seed of the instance and the runs
+
+OUTPUT
+result: dictionary with the mean best value of each mode
+"""
+
+def temperingCheck(size = 300, iterations = 60000, replicas = 4, runs = 3, seed = 0):
+    data = benchmarkInstances([size], seed)[-1][1]
+    return {mode: float(np.mean([sa.parallelAnneal(data, "auto", "auto", iterations, *scenarioParameters["uniform"], "distance",
+                                                   replicas = replicas, mode = mode, seed = [seed, run], moves = "2opt", neighbors = 8)[1]
+                                 for run in range(runs)])) for mode in ("restarts", "tempering")}
+
+"""
+runBenchmarks is used to run every instance, objective, and move set and collect the results together with a description
+of the machine, so results from different releases can be compared.
+
+INPUTS
+sizes: sizes of the uniform instances
+objectives: optimization types to run
+moveSets: move mixes to run
+iterations: iterations per run
+seed: seed of the instances and the runs
+(instances over denseLimit points are run with weights calculated on demand, see PointWeights)
+
+OUTPUT
+report: dictionary ready to be written as JSON
+"""
+
+def runBenchmarks(sizes = (100, 1000, 10000, 100000), objectives = ("distance", "time", "cost"), moveSets = ("swap", "2opt"),
+                  iterations = 20000, seed = 0, log = sys.stderr):
+    results = []
+    for name, data, parameters in benchmarkInstances(sizes, seed):
+        for optimizationType in objectives:
+            for moves in moveSets:
+                entry = {"instance": name, "objective": optimizationType, "moves": moves}
+                entry.update(benchmarkRun(data, parameters, optimizationType, moves, iterations, seed))
+                results.append(entry)
+                if log is not None:
+                    print("%s %s %s: %.0f iterations/sec" %(name, optimizationType, moves, entry["iterationsPerSecond"]), file = log)
+    return {"benchmarkVersion": 2, "seed": seed, "iterations": iterations, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+                        "python": platform.python_version(), "numpy": np.__version__},
+            "results": results, "tempering": temperingCheck()} #Fixed seed, so the check gives the same answer on every machine
+
+"""
+compareBenchmarks is used to find performance regressions between two benchmark reports. A run is a regression if its
+iterations per second dropped, or its time to a target grew, by more than the tolerance (0.2 is 20%). The run time (at the
+current iterations) or the time to a target must also grow by more than minimumSeconds, since small instances run in a
+fraction of a second, where timer and scheduling noise alone is larger than the tolerance. Times to targets are only
+compared between reports of the same benchmarkVersion (version 1 only checked the targets every 1000 iterations).
+
+INPUTS
+baseline: earlier report (from runBenchmarks)
+current: new report
+tolerance: allowed relative slowdown
+minimumSeconds: smallest growth of a run time or a time to a target that counts as a regression
+
+OUTPUT
+regressions: list of descriptions of each regression (including tempering doing worse than restarts in the current report)
+"""
+
+def compareBenchmarks(baseline, current, tolerance = 0.2, minimumSeconds = 0.1):
+    key = lambda entry: (entry["instance"], entry["objective"], json.dumps(entry["moves"], sort_keys = True))
+    earlier = {key(entry): entry for entry in baseline["results"] if "skipped" not in entry}
+    regressions = []
+    sameVersion = baseline.get("benchmarkVersion") == current.get("benchmarkVersion")
+    for entry in current["results"]:
+        old = earlier.get(key(entry))
+        if old is None or "skipped" in entry:
+            continue
+        label = "%s %s %s" %key(entry)
+        slower = lambda seconds, before: seconds > max((1 + tolerance) * before, before + minimumSeconds)
+        if slower(entry["runSeconds"], entry["iterations"] / old["iterationsPerSecond"]): #Run time of the old speed at the current iterations
+            regressions.append("%s: %.0f iterations/sec, was %.0f" %(label, entry["iterationsPerSecond"], old["iterationsPerSecond"]))
+        for target, reached in (entry["timeToTarget"].items() if sameVersion else ()):
+            before = old["timeToTarget"].get(target)
+            if before is not None and (reached is None or slower(reached["seconds"], before["seconds"])):
+                regressions.append("%s: time to %s of reference %s, was %.3f s" %(label, target,
+                                   "not reached" if reached is None else "%.3f s" %reached["seconds"], before["seconds"]))
+    tempering = current.get("tempering")
+    if tempering is not None and tempering["tempering"] > tempering["restarts"]:
+        regressions.append("tempering: best value %.1f, worse than %.1f of restarts" %(tempering["tempering"], tempering["restarts"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the Simulated Annealing salesman optimizer.")
+    parser.add_argument("--sizes", type = int, nargs = "*", default = [100, 1000, 10000, 100000], help = "sizes of the uniform instances")
+    parser.add_argument("--objectives", nargs = "*", default = ["distance", "time", "cost"])
+    parser.add_argument("--moves", nargs = "*", default = ["swap", "2opt"], help = "move types to benchmark")
+    parser.add_argument("--iterations", type = int, default = 20000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", help = "JSON file the report is written to (printed if not given)")
+    parser.add_argument("--compare", help = "earlier JSON report; exits with status 1 if any run regressed")
+    parser.add_argument("--tolerance", type = float, default = 0.2)
+    parser.add_argument("--minimum-seconds", type = float, default = 0.1, help = "smallest growth of a run time or time to a target that is a regression")
+    args = parser.parse_args()
+
+    report = runBenchmarks(args.sizes, args.objectives, args.moves, args.iterations, args.seed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent = 2)
+    else:
+        print(json.dumps(report, indent = 2))
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compareBenchmarks(json.load(file), report, args.tolerance, args.minimum_seconds)
+        for regression in regressions:
+            print("REGRESSION:", regression, file = sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -6,9 +6,24 @@ Date Due: 12/13/2023
 '''
 
 import numpy as np
-import random
 import math
-import matplotlib.pyplot as plt
+import bisect
+import struct
+import json
+import os
+import time
+import csv
+import hashlib
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+import concurrent.futures
+import contextlib
+import statistics
+import collections
+import heapq
+import tempfile
+import zipfile
 
 """
 pathGenerator is used to create a new path between coordinate points from an older path.
@@ -121,97 +136,1939 @@ def timeCostCalc(data,airCriteria,airSpeed,airCost,carSpeed,carCost, selector):
         return ValueError
 
 """
-annealDistance is used to minimize the total distance traveled with the Simulated Annealing method. 
-Multiple parameters are input to determine characteristics of air or land travel.
+The following functions load coordinate files such as us-state-capitals.csv.
+
+coordinateColumns: finds the coordinate columns of a header (x and y, or latitude and longitude)
+loadCoordinates: parses a CSV file in chunks of rows and converts each chunk's coordinates with numpy in one step, keeping
+the name of every point. The first load writes the points and names to .npy files in cacheDirectory, named by a hash of the
+file contents, and later loads of the same file open those memory-mapped instead of parsing the text again.
+A file without a header is read as x, y in its first two columns.
 
 INPUTS
-data: the path through which the salesman travels, which is a n by 2 numpy array
-T: starting temperature of Simulated Annealing temperature function (exponential decay model)
-rate: rate of temperature decay
-iterations: number of iterations ran by simulated annealing optimization
+path: CSV file of coordinate points
+nameColumn: column holding the point names, the "name" column (or else the first non coordinate column) if none is given
+cacheDirectory: folder of the .npy cache, or None to always parse the file
+chunkSize: rows parsed per chunk
 
 OUTPUTS
-bestGuess: the path which best minimizes distance
-bestDistance: the best distance after all iterations
-bestDistancePerIter: the best distance stored per single iteration
+data: the coordinate points, which is a n by 2 numpy array (memory-mapped and read only when loaded from the cache)
+names: length n numpy array of point names (empty strings if the file has no name column)
 """
 
-def annealDistance(data, T, rate, iterations):
+def coordinateColumns(fields):
+    lower = [field.strip().lower() for field in fields]
+    for first, second in (("x", "y"), ("latitude", "longitude"), ("lat", "lon"), ("lat", "long"), ("lat", "lng")):
+        if first in lower and second in lower:
+            return lower.index(first), lower.index(second)
+    raise ValueError("No coordinate columns (x and y, or latitude and longitude) in %s" %", ".join(fields))
+
+def loadCoordinates(path, nameColumn = None, cacheDirectory = ".salesman_cache", chunkSize = 1000000):
+    if cacheDirectory is not None:
+        digest = hashlib.sha256(repr(nameColumn).encode())
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        cachePath = os.path.join(cacheDirectory, digest.hexdigest()[:32])
+        if os.path.exists(cachePath + ".names.npy"): #The names are written last, so the points are complete when they exist
+            return np.load(cachePath + ".npy", mmap_mode = "r"), np.load(cachePath + ".names.npy", mmap_mode = "r")
+
+    chunks, nameChunks = [], []
+    with open(path, newline = "") as file:
+        first = file.readline()
+        header = next(csv.reader([first]), [])
+        try:
+            columns = coordinateColumns(header)
+        except ValueError:
+            columns = None
+        if columns is None: #No header, so the first line is already a point
+            columns, names, lines = (0, 1), None, [first]
+        else:
+            lower = [field.strip().lower() for field in header]
+            others = [k for k in range(len(header)) if k not in columns]
+            if nameColumn is not None:
+                names = header.index(nameColumn)
+            else:
+                names = lower.index("name") if "name" in lower else (others[0] if others else None)
+            lines = []
+        while True:
+            lines.extend(itertools.islice(file, chunkSize - len(lines)))
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                break
+            #Each chunk is converted by numpy's parser in one call instead of one row at a time
+            chunks.append(np.loadtxt(lines, delimiter = ",", quotechar = '"', usecols = columns, ndmin = 2))
+            nameChunks.append(np.loadtxt(lines, delimiter = ",", quotechar = '"', usecols = names, dtype = str, ndmin = 1)
+                              if names is not None else np.full(len(lines), ""))
+            lines = []
+    data = np.concatenate(chunks) if chunks else np.zeros((0, 2))
+    names = np.concatenate(nameChunks) if nameChunks else np.zeros(0, dtype = str)
+
+    if cacheDirectory is not None:
+        os.makedirs(cacheDirectory, exist_ok = True)
+        for suffix, array in ((".npy", data), (".names.npy", names)): #Written to temporary files first so a cache entry is never partial
+            with open(cachePath + ".tmp", "wb") as file:
+                np.save(file, array)
+            os.replace(cachePath + ".tmp", cachePath + suffix)
+    return data, names
 
-    bestDistancePerIter = []
-    coordinates = np.copy(data)
-    currentGuess = pathGenerator(coordinates) #Creating a first path guess.
-    currentDistance,currentDistanceVec = distanceCalc(currentGuess) 
-    #Determining the total distance and associated distance vector of the initial guess
+"""
+distanceMatrix is used to build the distance between every pair of coordinate points at once.
+The matrix is calculated with numpy in blocks of rows (see distanceTile), so the conversion is only done once per data set
+instead of once per edge per iteration, and the temporary arrays stay the size of one block.
+When a cacheDirectory is given, the matrix is saved there as a .npy file named by a hash of the points and the metric,
+and later calls with the same points open the saved matrix memory-mapped instead of building it again.
+
+metric "planar": the same degree to mile conversion as latLongCalc (69 and 54.6 miles per degree), used for points that
+are not latitude and longitude, such as scenarios 3 and 4
+metric "equirectangular": latitude and longitude distance with the longitude scaled by the cosine of the mean latitude of
+each pair, which is accurate for nearby points
+metric "haversine": great circle distance between latitude and longitude points, accurate everywhere (such as Juneau and
+Honolulu in scenario 1)
 
-    bestGuess = np.copy(currentGuess) #Determining a placeholder value for best guess
-    bestDistance, bestDistanceVec = distanceCalc(bestGuess)
-    
-    #Using for loop to go through iterations specified in anneal function:
-    for i in range(iterations):
-        newGuess = pathGenerator(currentGuess)
-        newDistance,newDistanceVec = distanceCalc(newGuess)
-        if newDistance < currentDistance or random.random() < math.exp((currentDistance - newDistance)/T):
-            currentGuess = newGuess
-            currentDistance = newDistance
-            if currentDistance < bestDistance:
-                bestDistance = currentDistance
-                bestDistanceVec = currentDistanceVec #Updating best guess if current guess is more optimal (least distance)
-        bestDistancePerIter.append(bestDistance) #Storing the best guess per iteration
-        
-        T = rate * T #Temperature decreases according to exponential rate
-    return bestGuess, bestDistance, bestDistancePerIter
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array (latitude and longitude in degrees for the spherical metrics)
+metric: "planar", "equirectangular", or "haversine"
+cacheDirectory: optional folder the built matrix is cached in
+blockSize: rows of the matrix calculated at once
 
+OUTPUT
+weights: n by n numpy array where weights[i,j] is the distance in miles between point i and point j
 """
-annealTime is used to minimize the total time traveled with the Simulated Annealing method. 
-Multiple parameters are input to determine characteristics of air or land travel.
+
+earthRadius = 3958.8 #miles
+
+distanceMetrics = ["planar", "equirectangular", "haversine"]
+
+def distanceTile(coordinates, start, stop, metric = "planar"): #Rows start to stop-1 of the distance matrix
+    block = coordinates[start:stop, np.newaxis, :]
+    if metric == "planar":
+        delta = coordinates[np.newaxis,:,:] - block #delta[i,j] = coord j - coord i
+        return np.sqrt((delta[:,:,0] * 69) ** 2 + (delta[:,:,1] * 54.6) ** 2) #conversion to miles
+    radians = np.radians(coordinates)
+    rows = radians[start:stop, np.newaxis, :]
+    deltLatit = radians[np.newaxis,:,0] - rows[:,:,0]
+    deltLong = radians[np.newaxis,:,1] - rows[:,:,1]
+    if metric == "equirectangular":
+        x = deltLong * np.cos((radians[np.newaxis,:,0] + rows[:,:,0]) / 2)
+        return earthRadius * np.sqrt(x ** 2 + deltLatit ** 2)
+    if metric == "haversine":
+        h = np.sin(deltLatit / 2) ** 2 + np.cos(rows[:,:,0]) * np.cos(radians[np.newaxis,:,0]) * np.sin(deltLong / 2) ** 2
+        return 2 * earthRadius * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+    raise ValueError("Unknown distance metric: %s" %metric)
+
+def distanceMatrix(data, metric = "planar", cacheDirectory = None, blockSize = 128):
+    coordinates = np.ascontiguousarray(data, dtype = float)
+    n = len(coordinates)
+    if metric not in distanceMetrics:
+        raise ValueError("Unknown distance metric: %s" %metric)
+    if cacheDirectory is None:
+        weights = np.empty((n, n))
+    else:
+        digest = hashlib.sha256(coordinates.tobytes() + metric.encode()).hexdigest()[:32]
+        cachePath = os.path.join(cacheDirectory, "%s.%s.npy" %(digest, metric))
+        if os.path.exists(cachePath):
+            return np.load(cachePath, mmap_mode = "r")
+        os.makedirs(cacheDirectory, exist_ok = True)
+        weights = np.lib.format.open_memmap(cachePath + ".tmp", mode = "w+", shape = (n, n)) #Built straight into the cache file
+    for start in range(0, n, blockSize):
+        weights[start:start + blockSize] = distanceTile(coordinates, start, min(start + blockSize, n), metric)
+    if cacheDirectory is not None:
+        weights.flush()
+        del weights
+        os.replace(cachePath + ".tmp", cachePath) #Renamed only when complete, so a cache entry is never partial
+        return np.load(cachePath, mmap_mode = "r")
+    return weights
+
+"""
+tourLength is used to calculate the total weight of a tour, where the tour is given as an order of point indices.
 
 INPUTS
-data: the path through which the salesman travels, which is a n by 2 numpy array
-T: starting temperature of Simulated Annealing temperature function (exponential decay model)
-rate: rate of temperature decay
-iterations: number of iterations ran by simulated annealing optimization
+tour: the order in which points are visited, which is a length n integer numpy array
+weights: n by n numpy array of edge weights (such as the output of distanceMatrix)
+
+OUTPUT
+total: the total weight traveled, including the return from the end point to the starting point
+"""
+
+def tourLength(tour, weights):
+    return float(np.sum(weights[tour, np.roll(tour, -1)]))
+
+"""
+swapDelta is used to score a two-city swap without recalculating the weight of the full tour.
+Swapping two elements of a tour only changes the (at most four) edges touching the swapped positions, so only those edges
+are looked up. Edge k is the edge joining position k to position k+1 (with the last position wrapping back to the start).
+
+INPUTS
+tour: the order in which points are visited, which is a length n integer numpy array
+weights: n by n numpy array of edge weights
+pivot1: index of the first position being swapped
+pivot2: index of the second position being swapped
+
+OUTPUT
+delta: the change in total weight if the two positions were swapped (tour is left unchanged)
+"""
+
+def swapDelta(tour, weights, pivot1, pivot2):
+    n = len(tour)
+    edges = {(pivot1 - 1) % n, pivot1, (pivot2 - 1) % n, pivot2} #Set removes duplicate edges when the pivots are adjacent
+    before = 0.0
+    for k in edges:
+        before += weights[tour[k], tour[(k + 1) % n]]
+    tour[pivot1], tour[pivot2] = tour[pivot2], tour[pivot1] #Temporarily swapping so the new edges can be looked up
+    after = 0.0
+    for k in edges:
+        after += weights[tour[k], tour[(k + 1) % n]]
+    tour[pivot1], tour[pivot2] = tour[pivot2], tour[pivot1] #Restoring the original order
+    return after - before
+
+"""
+The following functions make up the move set used by annealChain. Each move type has a propose function, which picks a move
+and scores it by looking up only the edges it changes, and an apply function, which makes the move in place.
+Positions are counted forward from a base position i, so moves that wrap past the end of the tour need no special cases.
+pos is the position index of the tour (pos[tour[k]] = k) and is kept up to date by every apply function.
+neighbors is an optional n by k array of nearest neighbors (see nearestNeighbors). When it is given, moves are built so that
+they join a point to one of its nearest neighbors, which on geometric data is far more likely to be an improvement.
+The 2-opt, Or-opt, and 3-opt moves assume the weights are symmetric, which is true of distance, time, and cost.
+Applying a 2-opt or Or-opt move rewrites the shorter side of the tour, so on large instances a move across the tour costs
+up to n/2 writes. A proposed move whose shorter side has L > segmentLimit points is only kept with probability segmentLimit / L,
+and is otherwise replaced by a random move of at most segmentLimit points. This bounds the expected writes of every move by
+about 2 * segmentLimit, while long moves (which mend the long edges of a greedy starting tour) are still made.
+
+swap: exchanges the points at two positions (the move of pathGenerator)
+2opt: reverses the segment between two edges
+oropt: moves a segment of 1 to 3 points to a different edge, inserted in whichever direction is cheaper
+3opt: exchanges two neighboring segments without reversing either
+"""
+
+segmentLimit = 2500 #Shorter side length above which 2-opt and Or-opt moves are thinned
+
+def offsetIndex(i, start, stop, n): #Tour positions for offsets start to stop-1 counted forward from position i
+    return (i + np.arange(start, stop)) % n
+
+def candidateOffset(tour, pos, neighbors, rng, i): #Offset from position i of a random nearest neighbor of the point at i
+    n = len(tour)
+    row = neighbors[tour[i]]
+    return (int(pos[row[int(rng.integers(len(row)))]]) - i) % n
+
+def proposeSwap(tour, pos, weights, neighbors, rng):
+    n = len(tour)
+    if neighbors is None:
+        pivot1, pivot2 = randomPivots(n, rng)
+    else: #Moving a neighbor of the first point next to it
+        pivot1 = int(rng.integers(n))
+        pivot2 = (pivot1 + candidateOffset(tour, pos, neighbors, rng, pivot1) - 1) % n
+        if pivot2 == pivot1:
+            pivot2 = (pivot1 + 1) % n
+    return swapDelta(tour, weights, pivot1, pivot2), (pivot1, pivot2)
+
+def applySwap(tour, pos, move):
+    pivot1, pivot2 = move
+    tour[pivot1], tour[pivot2] = tour[pivot2], tour[pivot1]
+    pos[tour[pivot1]] = pivot1
+    pos[tour[pivot2]] = pivot2
+
+def proposeTwoOpt(tour, pos, weights, neighbors, rng):
+    n = len(tour)
+    i = int(rng.integers(n))
+    j = candidateOffset(tour, pos, neighbors, rng, i) if neighbors is not None else 0
+    if j < 2 or j > n - 2: #Falling back to a random segment when the neighbor is already adjacent
+        j = int(rng.integers(2, n - 1))
+    if segmentLimit < j < n - segmentLimit and rng.random() * min(j, n - j) > segmentLimit: #Thinning long moves (see segmentLimit)
+        j = int(rng.integers(2, segmentLimit + 1))
+    a, b = tour[i], tour[(i + 1) % n]
+    c, d = tour[(i + j) % n], tour[(i + j + 1) % n]
+    delta = weights[a, c] + weights[b, d] - weights[a, b] - weights[c, d] #Edges (a,b) and (c,d) become (a,c) and (b,d)
+    return delta, (i, j)
+
+def applyTwoOpt(tour, pos, move):
+    i, j = move
+    n = len(tour)
+    if j <= n - j: #Reversing the inside segment or its complement gives the same cycle, so the shorter one is reversed
+        index = offsetIndex(i, 1, j + 1, n)
+    else:
+        index = offsetIndex(i, j + 1, n + 1, n)
+    cities = tour[index][::-1]
+    tour[index] = cities
+    pos[cities] = index
+
+def proposeOrOpt(tour, pos, weights, neighbors, rng):
+    n = len(tour)
+    length = int(rng.integers(1, min(3, n - 3) + 1)) #Segment length between 1 and 3
+    i = int(rng.integers(n))
+    j = candidateOffset(tour, pos, neighbors, rng, i) if neighbors is not None else 0
+    if j < length or j > n - 2: #Falling back to a random edge when the neighbor is inside or next to the segment
+        j = int(rng.integers(length, n - 1))
+    if segmentLimit < j < n - segmentLimit and rng.random() * min(j, n - j) > segmentLimit: #Thinning long moves (see segmentLimit)
+        j = int(rng.integers(length, segmentLimit + 1))
+    first, last = tour[i], tour[(i + length - 1) % n]
+    before, after = tour[(i - 1) % n], tour[(i + length) % n]
+    p, q = tour[(i + j) % n], tour[(i + j + 1) % n] #The segment is inserted between p and q
+    removal = weights[before, after] - weights[before, first] - weights[last, after] - weights[p, q]
+    forward = weights[p, first] + weights[last, q]
+    backward = weights[p, last] + weights[first, q]
+    return removal + min(forward, backward), (i, j, length, backward < forward)
+
+def applyOrOpt(tour, pos, move):
+    i, j, length, reverse = move
+    n = len(tour)
+    segment = tour[offsetIndex(i, 0, length, n)]
+    if reverse:
+        segment = segment[::-1]
+    if j + 1 <= n - j - 1 + length: #Shifting whichever side of the tour between the segment and the new edge is shorter
+        index = offsetIndex(i, 0, j + 1, n)
+        cities = np.concatenate((tour[index][length:], segment))
+    else:
+        index = offsetIndex(i, j + 1, n + length, n)
+        cities = np.concatenate((segment, tour[index][:-length]))
+    tour[index] = cities
+    pos[cities] = index
+
+def proposeThreeOpt(tour, pos, weights, neighbors, rng):
+    n = len(tour)
+    i = int(rng.integers(n))
+    a = candidateOffset(tour, pos, neighbors, rng, i) - 1 if neighbors is not None else 0
+    if a < 1 or a > n - 2:
+        a = int(rng.integers(1, n - 1))
+    b = int(rng.integers(a + 1, n)) #Segments are offsets 1 to a and a+1 to b
+    t0, t1 = tour[i], tour[(i + 1) % n]
+    ta, ta1 = tour[(i + a) % n], tour[(i + a + 1) % n]
+    tb, tb1 = tour[(i + b) % n], tour[(i + b + 1) % n]
+    delta = weights[t0, ta1] + weights[tb, t1] + weights[ta, tb1] - weights[t0, t1] - weights[ta, ta1] - weights[tb, tb1]
+    return delta, (i, a, b)
+
+def applyThreeOpt(tour, pos, move):
+    i, a, b = move
+    n = len(tour)
+    index = offsetIndex(i, 1, b + 1, n)
+    values = tour[index]
+    cities = np.concatenate((values[a:], values[:a]))
+    tour[index] = cities
+    pos[cities] = index
+
+moveTypes = {"swap": (proposeSwap, applySwap), "2opt": (proposeTwoOpt, applyTwoOpt),
+             "oropt": (proposeOrOpt, applyOrOpt), "3opt": (proposeThreeOpt, applyThreeOpt)}
+
+"""
+The following functions give the edges removed and added by a proposed move (before it is applied), as arrays of point pairs.
+They let a move be scored against several weight matrices at once, which is used by paretoAnneal.
+"""
+
+def swapEdges(tour, move):
+    pivot1, pivot2 = move
+    n = len(tour)
+    positions = np.array(sorted({(pivot1 - 1) % n, pivot1, (pivot2 - 1) % n, pivot2}))
+    swapped = np.copy(tour[np.concatenate((positions, (positions + 1) % n))])
+    removed = swapped.reshape(2, -1).T.copy()
+    lookup = {pivot1: tour[pivot2], pivot2: tour[pivot1]}
+    added = np.array([[lookup.get(k, tour[k]), lookup.get((k + 1) % n, tour[(k + 1) % n])] for k in positions])
+    return removed, added
+
+def twoOptEdges(tour, move):
+    i, j = move
+    n = len(tour)
+    a, b, c, d = tour[i], tour[(i + 1) % n], tour[(i + j) % n], tour[(i + j + 1) % n]
+    return np.array([[a, b], [c, d]]), np.array([[a, c], [b, d]])
+
+def orOptEdges(tour, move):
+    i, j, length, reverse = move
+    n = len(tour)
+    first, last = tour[i], tour[(i + length - 1) % n]
+    before, after = tour[(i - 1) % n], tour[(i + length) % n]
+    p, q = tour[(i + j) % n], tour[(i + j + 1) % n]
+    if reverse:
+        first, last = last, first
+    return np.array([[before, tour[i]], [tour[(i + length - 1) % n], after], [p, q]]), np.array([[before, after], [p, first], [last, q]])
+
+def threeOptEdges(tour, move):
+    i, a, b = move
+    n = len(tour)
+    t0, t1 = tour[i], tour[(i + 1) % n]
+    ta, ta1 = tour[(i + a) % n], tour[(i + a + 1) % n]
+    tb, tb1 = tour[(i + b) % n], tour[(i + b + 1) % n]
+    return np.array([[t0, t1], [ta, ta1], [tb, tb1]]), np.array([[t0, ta1], [tb, t1], [ta, tb1]])
+
+moveEdges = {"swap": swapEdges, "2opt": twoOptEdges, "oropt": orOptEdges, "3opt": threeOptEdges}
+
+"""
+nearestNeighbors is used to build the candidate lists used to bias moves. The rows of weights are processed in blocks so 
+that only a block of the matrix is copied at a time.
+
+INPUTS
+weights: n by n numpy array of edge weights
+k: number of neighbors kept per point
+
+OUTPUT
+neighbors: n by k integer numpy array, row i holds the k points with the smallest weights from point i (closest first)
+(for a PointWeights, the k nearest points found with a spatial grid instead, so no row of the matrix is built)
+"""
+
+def nearestNeighbors(weights, k, blockSize = 1024):
+    if isinstance(weights, PointWeights):
+        return weights.nearestNeighbors(k)
+    n = len(weights)
+    k = min(k, n - 1)
+    neighbors = np.zeros((n, k), dtype = np.int32)
+    for start in range(0, n, blockSize):
+        block = np.array(weights[start:start + blockSize], dtype = float)
+        rows = np.arange(len(block))
+        block[rows, rows + start] = np.inf #A point is never its own neighbor
+        nearest = np.argpartition(block, k - 1, axis = 1)[:, :k]
+        order = np.argsort(block[rows[:, np.newaxis], nearest], axis = 1) #Sorting the k neighbors closest first
+        neighbors[start:start + blockSize] = np.take_along_axis(nearest, order, axis = 1)
+    return neighbors
+
+"""
+moveMix is used to turn the moves option of annealOptimization into move names and cumulative selection probabilities.
+
+INPUT
+moves: a move name (such as "2opt") or a dictionary of move names and relative weights (such as {"2opt": 3, "oropt": 1})
+
+OUTPUTS
+names: list of move names
+cumulative: cumulative selection probability of each move
+"""
+
+def moveMix(moves):
+    if isinstance(moves, str):
+        moves = {moves: 1.0}
+    names = list(moves)
+    for name in names:
+        if name not in moveTypes:
+            raise ValueError("Unknown move type: %s" %name)
+    cumulative = np.cumsum([float(moves[name]) for name in names])
+    return names, list(cumulative / cumulative[-1])
+
+"""
+edgeWeights is used to build the per-edge weight matrix that Simulated Annealing minimizes for a given optimization type.
+The distance matrix is calculated once, and the air or car choice of timeCostCalc is made for every edge with numpy,
+so time and cost are scored exactly like distance. Time and cost are calculated in place of the distances (or into a single
+new matrix when the distances come from the cache), a block of rows at a time, so the build never holds more than one
+n by n matrix.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
 airCriteria: maximum distance in miles salesman is willing to drive
 airSpeed: average speed of air travel, measured in mph
 airCost: cost of air travel, measured in dollars per hour
 carSpeed: average speed of car travel, measured in mph
 carCost: cost of car travel, measured in dollars per hour
+optimizationType: "distance", "time", or "cost"
+metric: distance metric, "planar", "equirectangular", or "haversine" (see distanceMatrix)
+cacheDirectory: optional folder the distance matrix is cached in (see distanceMatrix)
+
+OUTPUT
+weights: n by n numpy array where weights[i,j] is the distance, time, or cost of traveling from point i to point j
+(a PointWeights calculating the weights on demand for instances over denseLimit points)
+"""
+
+def edgeWeights(data, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric = "planar", cacheDirectory = None):
+    if len(data) > denseLimit:
+        return PointWeights(data, optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric)
+    distances = distanceMatrix(data, metric, cacheDirectory)
+    return objectiveWeights(distances, optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost,
+                            out = distances if distances.flags.writeable else None) #Cached distances are read only
+
+def objectiveWeights(distances, optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, out = None, blockSize = 128):
+    #Weights of edges of the given distances, written into out (which may be distances itself) or a new array
+    if optimizationType == "distance":
+        return distances
+    if optimizationType == "time":
+        air, car, operation = airSpeed, carSpeed, np.divide
+    elif optimizationType == "cost":
+        air, car, operation = airCost, carCost, np.multiply
+    else:
+        raise ValueError("Unknown optimization type: %s" %optimizationType)
+    if out is None:
+        out = np.empty(distances.shape)
+    for start in range(0, len(distances), blockSize): #A block of rows at a time, so no temporary is as large as the matrix
+        rows = distances[start:start + blockSize]
+        fly = rows > airCriteria #Same air criteria as timeCostCalc
+        operation(rows, air, out = out[start:start + blockSize], where = fly)
+        operation(rows, car, out = out[start:start + blockSize], where = ~fly)
+    return out
+
+"""
+PointWeights is used in place of the weight matrix for large instances, where n by n weights no longer fit in memory
+(100,000 points would need 80 GB). Only the coordinates are stored, as float32, and the weight of an edge is calculated
+when it is looked up, with the same metric and air or car choice as edgeWeights. weights[a, b] works like the matrix for
+a pair of points, for arrays of points (such as weights[tour, np.roll(tour, -1)] in tourLength), and for blocks of rows
+(weights[start:stop]), so the moves, tourLength, and annealChain work on it unchanged. Together with nearest neighbor
+candidate lists from SpatialGrid.kNearest (see nearestNeighbors), memory stays proportional to n times k.
+Single pairs are looked up from plain python lists of the coordinates, which is as fast as indexing a numpy matrix.
+edgeWeights returns a PointWeights instead of a matrix for instances over denseLimit points.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric: same as edgeWeights
+
+METHODS
+nearestNeighbors(k): n by k array of the (approximate) k nearest points to every point
+"""
+
+denseLimit = 5000 #Largest instance given a dense weight matrix by edgeWeights (200 MB), PointWeights lookups are as fast above it
+
+class PointWeights:
+
+    def __init__(self, data, optimizationType = "distance", airCriteria = 300, airSpeed = 600, airCost = 10.0, carSpeed = 60, carCost = 1,
+                 metric = "planar"):
+        if metric not in distanceMetrics:
+            raise ValueError("Unknown distance metric: %s" %metric)
+        if optimizationType not in ("distance", "time", "cost"):
+            raise ValueError("Unknown optimization type: %s" %optimizationType)
+        self.points = np.ascontiguousarray(data, dtype = np.float32)
+        self.settings = {"optimizationType": optimizationType, "airCriteria": airCriteria, "airSpeed": airSpeed, "airCost": airCost,
+                         "carSpeed": carSpeed, "carCost": carCost, "metric": metric}
+        self.optimizationType, self.metric = optimizationType, metric
+        self.airCriteria, self.airSpeed, self.airCost, self.carSpeed, self.carCost = airCriteria, airSpeed, airCost, carSpeed, carCost
+        self.shape = (len(self.points), len(self.points))
+        first, second = self.columns()
+        self.firstColumn, self.secondColumn = first, second #Kept for lookups of arrays of points
+        self.first, self.second = first.tolist(), second.tolist() #Python floats, which are fastest for single lookups
+        self.cosColumn = np.cos(first) if metric == "haversine" else None
+        self.cosLatit = self.cosColumn.tolist() if metric == "haversine" else None
+
+    def __len__(self):
+        return len(self.points)
+
+    def columns(self): #Coordinates in the units the metric works in (miles for planar, radians otherwise)
+        coordinates = self.points.astype(float)
+        if self.metric == "planar":
+            return coordinates[:, 0] * 69, coordinates[:, 1] * 54.6 #conversion to miles
+        return np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+
+    def __getitem__(self, key):
+        a, b = key if isinstance(key, tuple) else (key, slice(None))
+        try: #A single pair of points
+            first, second = self.first, self.second
+            if self.metric == "planar":
+                distance = math.hypot(first[a] - first[b], second[a] - second[b])
+            elif self.metric == "haversine":
+                h = math.sin((first[b] - first[a]) / 2) ** 2 + self.cosLatit[a] * self.cosLatit[b] * math.sin((second[b] - second[a]) / 2) ** 2
+                distance = 2 * earthRadius * math.asin(math.sqrt(min(h, 1.0)))
+            else:
+                x = (second[b] - second[a]) * math.cos((first[a] + first[b]) / 2)
+                distance = earthRadius * math.hypot(x, first[b] - first[a])
+        except TypeError: #Arrays of points or a block of rows
+            return self.transform(self.distanceArray(a, b))
+        if self.optimizationType == "distance":
+            return distance
+        if self.optimizationType == "time":
+            return distance/self.airSpeed if distance > self.airCriteria else distance/self.carSpeed
+        return distance * self.airCost if distance > self.airCriteria else distance * self.carCost
+
+    def distanceArray(self, a, b):
+        if isinstance(a, slice): #Rows a of the full matrix
+            start, stop, _ = a.indices(len(self.points))
+            return distanceTile(self.points.astype(float), start, stop, self.metric)[:, b]
+        first, second = self.firstColumn, self.secondColumn
+        a, b = np.asarray(a), np.asarray(b)
+        if self.metric == "planar":
+            return np.sqrt((first[a] - first[b]) ** 2 + (second[a] - second[b]) ** 2)
+        if self.metric == "haversine":
+            h = np.sin((first[b] - first[a]) / 2) ** 2 + self.cosColumn[a] * self.cosColumn[b] * np.sin((second[b] - second[a]) / 2) ** 2
+            return 2 * earthRadius * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+        x = (second[b] - second[a]) * np.cos((first[a] + first[b]) / 2)
+        return earthRadius * np.sqrt(x ** 2 + (first[b] - first[a]) ** 2)
+
+    def transform(self, distances): #Same air or car choice as edgeWeights
+        if self.optimizationType == "distance":
+            return distances
+        fly = distances > self.airCriteria
+        if self.optimizationType == "time":
+            return np.where(fly, distances/self.airSpeed, distances/self.carSpeed)
+        return np.where(fly, distances * self.airCost, distances * self.carCost)
+
+    def nearestNeighbors(self, k):
+        if self.metric == "haversine": #Great circle distance grows with the straight line distance through the sphere
+            return SpatialGrid(sphereCoordinates(self.points)).kNearest(k)
+        return SpatialGrid(scaledCoordinates(self.points)).kNearest(k)
+
+"""
+scaledCoordinates is used to convert coordinate points to the same mile scale used by latLongCalc, so that straight line
+distances between the converted points equal the distances used everywhere else.
+
+INPUT
+data: the coordinate points, which is a n by 2 numpy array
+
+OUTPUT
+points: n by 2 numpy array of points in miles
+"""
+
+def scaledCoordinates(data):
+    return np.asarray(data, dtype = float) * np.array([69, 54.6]) #conversion to miles
+
+"""
+sphereCoordinates is used to place latitude and longitude points on the unit sphere. The straight line (chord) distance between
+two of these points only grows with their great circle distance, so nearest points under the haversine metric are found by
+a SpatialGrid over them, including near the poles and across the 180th meridian where scaledCoordinates is distorted.
+
+INPUT
+data: the coordinate points in degrees of latitude and longitude, which is a n by 2 numpy array
+
+OUTPUT
+points: n by 3 numpy array of points on the unit sphere
+"""
+
+def sphereCoordinates(data):
+    latitude, longitude = np.radians(np.asarray(data, dtype = float)).T
+    return np.column_stack((np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)))
+
+"""
+SpatialGrid is a uniform grid over a set of points, used to answer nearest point queries without comparing against every point.
+Cells are sized so that each holds about perCell points. Points can be switched off and on (deactivate and activate),
+and only active points are returned by nearest, which is what the tour construction heuristics need.
+
+INPUTS
+points: n by 2 or n by 3 numpy array of points (such as the output of scaledCoordinates or sphereCoordinates)
+perCell: average number of points per grid cell
+
+METHODS
+nearest(query): index of the nearest active point to the query point, or -1 if no points are active
+kNearest(k): n by k array of the (approximate) k nearest points to every point, found from the surrounding cells
+"""
+
+class SpatialGrid:
+
+    def __init__(self, points, perCell = 2):
+        self.points = np.asarray(points, dtype = float)
+        n = len(self.points)
+        self.low = self.points.min(axis = 0)
+        spans = np.maximum(self.points.max(axis = 0) - self.low, 1e-12)
+        cellCount = max(1.0, n / perCell)
+        widest = np.sort(spans)[::-1]
+        #Wider cells for points along a line (or, in 3-D, on a thin surface), so there are never far more cells than cellCount
+        self.cellSize = max(float(np.prod(widest[:d])) ** (1 / d) / cellCount ** (1 / d) for d in range(1, len(spans) + 1))
+        self.shape = tuple(max(1, int(math.ceil(span / self.cellSize))) for span in spans)
+        self.gx, self.gy = self.shape[0], self.shape[1]
+        cells = self.cellCoordinates(self.points)
+        self.cellOf = np.ravel_multi_index(cells.T, self.shape)
+        self.order = np.argsort(self.cellOf, kind = "stable").astype(np.int64) #Points sorted by cell
+        self.starts = np.searchsorted(self.cellOf[self.order], np.arange(int(np.prod(self.shape)) + 1))
+        self.count = np.bincount(self.cellOf, minlength = int(np.prod(self.shape))) #Number of active points per cell
+        self.active = np.ones(n, dtype = bool)
+
+    def cellCoordinates(self, points):
+        cells = np.floor((np.atleast_2d(points) - self.low) / self.cellSize).astype(np.int64)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def cellPoints(self, cell):
+        return self.order[self.starts[cell]:self.starts[cell + 1]]
+
+    def deactivate(self, i):
+        if self.active[i]:
+            self.active[i] = False
+            self.count[self.cellOf[i]] -= 1
+
+    def activate(self, i):
+        if not self.active[i]:
+            self.active[i] = True
+            self.count[self.cellOf[i]] += 1
+
+    def ring(self, cx, cy, r, cz = None): #Cells at Chebyshev distance r from cell (cx, cy) (or (cx, cy, cz)) which lie inside the grid
+        if cz is not None:
+            return self.ring3(cx, cy, cz, r)
+        if r == 0:
+            return [cx * self.gy + cy]
+        cells = []
+        for x in range(max(cx - r, 0), min(cx + r, self.gx - 1) + 1):
+            if x == cx - r or x == cx + r:
+                ys = range(max(cy - r, 0), min(cy + r, self.gy - 1) + 1)
+            else:
+                ys = [y for y in (cy - r, cy + r) if 0 <= y < self.gy]
+            cells.extend(x * self.gy + y for y in ys)
+        return cells
+
+    def ring3(self, cx, cy, cz, r): #Same as ring for a 3-D grid, as the 2-D rings of every layer with the full squares of the end layers
+        gz = self.shape[2]
+        cells = []
+        for z in range(max(cz - r, 0), min(cz + r, gz - 1) + 1):
+            if z == cz - r or z == cz + r:
+                for x in range(max(cx - r, 0), min(cx + r, self.gx - 1) + 1):
+                    cells.extend((x * self.gy + y) * gz + z for y in range(max(cy - r, 0), min(cy + r, self.gy - 1) + 1))
+            else:
+                cells.extend(cell * gz + z for cell in self.ring(cx, cy, r))
+        return cells
+
+    def distances(self, offsets): #Lengths of offset vectors along the last axis
+        if offsets.shape[-1] == 2:
+            return np.hypot(offsets[..., 0], offsets[..., 1])
+        return np.sqrt((offsets ** 2).sum(axis = -1))
+
+    def nearest(self, query):
+        center = self.cellCoordinates(query)[0].tolist()
+        reach = max(max(c, g - 1 - c) for c, g in zip(center, self.shape)) #Ring beyond which the grid is empty
+        best, bestDistance = -1, np.inf
+        for r in range(reach + 1):
+            if (r - 1) * self.cellSize >= bestDistance: #Every point in ring r is at least (r-1) cells away
+                break
+            for cell in self.ring(*center[:2], r, *center[2:]):
+                if self.count[cell] == 0:
+                    continue
+                candidates = self.cellPoints(cell)
+                candidates = candidates[self.active[candidates]]
+                distances = self.distances(self.points[candidates] - query)
+                k = int(np.argmin(distances))
+                if distances[k] < bestDistance:
+                    best, bestDistance = int(candidates[k]), float(distances[k])
+        return best
+
+    def kNearest(self, k):
+        n = len(self.points)
+        k = min(k, n - 1)
+        neighbors = np.zeros((n, k), dtype = np.int32)
+        total = np.bincount(self.cellOf, minlength = len(self.count))
+        occupied = np.nonzero(total)[0]
+        for cell, coordinates in zip(occupied, np.column_stack(np.unravel_index(occupied, self.shape)).tolist()):
+            members = self.cellPoints(cell)
+            rings, found, r = [], 0, 0
+            while found <= k and r <= max(self.shape): #Growing rings until there are enough candidates
+                rings.extend(self.ring(*coordinates[:2], r, *coordinates[2:]))
+                found = int(total[rings].sum())
+                r += 1
+            rings.extend(self.ring(*coordinates[:2], r, *coordinates[2:])) #One extra ring so that nearer points just across a cell border are included
+            candidates = np.concatenate([self.cellPoints(c) for c in rings])
+            distances = self.distances(self.points[members][:, np.newaxis, :] - self.points[candidates][np.newaxis, :, :])
+            distances[members[:, np.newaxis] == candidates[np.newaxis, :]] = np.inf #A point is never its own neighbor
+            nearest = np.argpartition(distances, k - 1, axis = 1)[:, :k]
+            order = np.argsort(np.take_along_axis(distances, nearest, axis = 1), axis = 1)
+            neighbors[members] = candidates[np.take_along_axis(nearest, order, axis = 1)]
+        return neighbors
+
+"""
+The following functions build a starting tour for Simulated Annealing from the coordinates, instead of the random swap of the
+input order made by pathGenerator. Each uses a SpatialGrid (or a sort) so they stay practical for very large point sets.
+
+nearestNeighborTour: starting from the first point, always travels to the nearest unvisited point
+greedyEdgeTour: adds the shortest candidate edges that keep every point at degree two or less without closing a loop early,
+then joins the resulting path pieces end to end by nearest endpoint
+spaceFillingTour: visits the points in the order of a Hilbert curve through the bounding box
+insertionTour: cheapest insertion, starting from a random point and its two nearest neighbors, always inserts the point and
+tour edge that add the least length. The edges considered for a point are those next to its k nearest neighbors, and a heap
+keeps the cheapest insertion of every point, updated when one of its neighbors is inserted, so each step costs log n instead
+of a search over every point and edge. A point none of whose neighbors are in the tour yet (in a separate cluster) is only
+inserted, next to its nearest inserted point, once the heap runs out.
+
+INPUT
+data: the coordinate points, which is a n by 2 numpy array
+rng: numpy random Generator (insertionTour only)
+k: number of nearest neighbors whose edges are considered (insertionTour only)
+
+OUTPUT
+tour: length n integer numpy array with the order in which points are visited
+"""
+
+def nearestNeighborTour(data, rng = None):
+    points = scaledCoordinates(data)
+    n = len(points)
+    grid = SpatialGrid(points)
+    tour = np.zeros(n, dtype = np.int32)
+    grid.deactivate(0)
+    for i in range(1, n):
+        tour[i] = grid.nearest(points[tour[i - 1]])
+        grid.deactivate(tour[i])
+    return tour
+
+def greedyEdgeTour(data, rng = None, k = 10):
+    points = scaledCoordinates(data)
+    n = len(points)
+    if n < 3:
+        return np.arange(n, dtype = np.int32)
+    grid = SpatialGrid(points)
+    neighbors = grid.kNearest(k)
+    first = np.repeat(np.arange(n), neighbors.shape[1])
+    second = neighbors.ravel().astype(np.int64)
+    keep = first < second #Each candidate edge is kept once
+    first, second = first[keep], second[keep]
+    lengths = np.hypot(*(points[first] - points[second]).T)
+    order = np.argsort(lengths, kind = "stable")
+
+    adjacent = np.full((n, 2), -1, dtype = np.int64)
+    degree = np.zeros(n, dtype = np.int64)
+    parent = np.arange(n) #Union find over path pieces so that no loop is closed early
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for edge in order:
+        a, b = first[edge], second[edge]
+        if degree[a] < 2 and degree[b] < 2:
+            rootA, rootB = find(a), find(b)
+            if rootA != rootB:
+                parent[rootA] = rootB
+                adjacent[a, degree[a]] = b
+                adjacent[b, degree[b]] = a
+                degree[a] += 1
+                degree[b] += 1
+
+    #Joining the path pieces end to end, always moving to the nearest free endpoint of another piece
+    grid.active[:] = degree < 2
+    grid.count = np.bincount(grid.cellOf[grid.active], minlength = len(grid.count))
+    tour = np.zeros(n, dtype = np.int32)
+    filled = 0
+    end = int(np.nonzero(degree < 2)[0][0])
+    while filled < n:
+        grid.deactivate(end)
+        previous, current = -1, end
+        while current != -1: #Walking along the piece to its other end
+            tour[filled] = current
+            filled += 1
+            step = adjacent[current, 0] if adjacent[current, 0] != previous else adjacent[current, 1]
+            previous, current = current, step
+        grid.deactivate(previous)
+        if filled < n:
+            end = grid.nearest(points[previous])
+    return tour
+
+def spaceFillingTour(data, rng = None, bits = 16):
+    points = scaledCoordinates(data)
+    side = 2 ** bits
+    spans = np.maximum(points.max(axis = 0) - points.min(axis = 0), 1e-12)
+    grid = np.floor((points - points.min(axis = 0)) / spans.max() * (side - 1)).astype(np.int64)
+    x, y = grid[:,0].copy(), grid[:,1].copy()
+    d = np.zeros(len(points), dtype = np.int64)
+    s = side // 2
+    while s > 0: #Hilbert curve index of every point (the standard xy to d conversion, done for all points at once)
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        turn = ~ry
+        x[turn], y[turn] = y[turn], x[turn].copy()
+        s //= 2
+    return np.argsort(d, kind = "stable").astype(np.int32)
+
+def insertionTour(data, rng = None, k = 8):
+    points = scaledCoordinates(data)
+    n = len(points)
+    rng = np.random.default_rng(rng)
+    if n < 4:
+        return rng.permutation(n).astype(np.int32)
+    grid = SpatialGrid(points)
+    neighbors = grid.kNearest(k)
+    grid.active[:] = False
+    grid.count[:] = 0
+    #listedBy[listedStart[p]:listedStart[p+1]] are the points which have p among their nearest neighbors
+    listedBy = np.argsort(neighbors, axis = None, kind = "stable") // neighbors.shape[1]
+    listedStart = np.searchsorted(np.sort(neighbors, axis = None), np.arange(n + 1))
+    following = np.full(n, -1, dtype = np.int64) #Tour kept as a linked list so that inserting is a constant time step
+    preceding = np.full(n, -1, dtype = np.int64)
+    inserted = np.zeros(n, dtype = bool)
+    heap = [] #(added length, point, edge start, edge end), entries whose edge is gone are recalculated when they come up
+
+    def distance(i, j):
+        return np.hypot(points[i, 0] - points[j, 0], points[i, 1] - points[j, 1])
+
+    def push(waiting): #Cheapest insertion of each waiting point into an edge next to one of its inserted neighbors
+        near = neighbors[waiting]
+        starts = np.concatenate((preceding[near], near), axis = 1) #Edges (preceding, neighbor) and (neighbor, following)
+        ends = np.concatenate((near, following[near]), axis = 1)
+        moved = np.repeat(waiting[:, np.newaxis], starts.shape[1], axis = 1)
+        added = np.where(inserted[np.concatenate((near, near), axis = 1)],
+                         distance(starts, moved) + distance(moved, ends) - distance(starts, ends), np.inf)
+        best = np.argmin(added, axis = 1)
+        rows = np.arange(len(waiting))
+        for point, cost, left, right in zip(waiting.tolist(), added[rows, best].tolist(), starts[rows, best].tolist(), ends[rows, best].tolist()):
+            if cost < np.inf:
+                heapq.heappush(heap, (cost, point, left, right))
+
+    def insert(p, left, right):
+        following[left], preceding[p] = p, left
+        following[p], preceding[right] = right, p
+        inserted[p] = True
+        grid.activate(p)
+
+    a = int(rng.integers(n))
+    b, c = neighbors[a, :2]
+    following[a], following[b], following[c] = b, c, a
+    preceding[b], preceding[c], preceding[a] = a, b, c
+    for p in (a, b, c):
+        inserted[p] = True
+        grid.activate(p)
+    for p in (a, b, c):
+        waiting = listedBy[listedStart[p]:listedStart[p + 1]]
+        push(waiting[~inserted[waiting]])
+    for _ in range(n - 3):
+        while heap:
+            cost, p, left, right = heapq.heappop(heap)
+            if inserted[p]:
+                continue
+            if following[left] != right: #The edge was split by an earlier insertion
+                push(np.array([p]))
+                continue
+            break
+        else: #Every point left is in a cluster without inserted neighbors
+            p = int(np.flatnonzero(~inserted)[0])
+            q = grid.nearest(points[p])
+            before, after = preceding[q], following[q]
+            #Inserting on whichever side of the nearest point adds less length
+            if distance(before, p) + distance(p, q) - distance(before, q) < distance(q, p) + distance(p, after) - distance(q, after):
+                left, right = before, q
+            else:
+                left, right = q, after
+        insert(p, left, right)
+        waiting = listedBy[listedStart[p]:listedStart[p + 1]]
+        push(waiting[~inserted[waiting]])
+    tour = np.zeros(n, dtype = np.int32)
+    current = a
+    for i in range(n):
+        tour[i] = current
+        current = following[current]
+    return tour
+
+tourHeuristics = {"nearest": nearestNeighborTour, "greedy": greedyEdgeTour, "spacefill": spaceFillingTour, "insertion": insertionTour}
+
+"""
+initialTour is used to build a starting tour with one of the construction heuristics above.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+method: "nearest", "greedy", "spacefill", "insertion", or "random" (a random swap of the input order, as in pathGenerator)
+rng: numpy random Generator (or seed)
+
+OUTPUT
+tour: length n integer numpy array with the order in which points are visited
+"""
+
+def initialTour(data, method, rng = None):
+    if method == "random":
+        tour = np.arange(len(data), dtype = np.int32)
+        if len(tour) > 1:
+            pivot1, pivot2 = randomPivots(len(tour), np.random.default_rng(rng))
+            tour[pivot1], tour[pivot2] = tour[pivot2], tour[pivot1]
+        return tour
+    if method not in tourHeuristics:
+        raise ValueError("Unknown starting tour heuristic: %s" %method)
+    return tourHeuristics[method](data, rng)
+
+"""
+randomPivots is used to choose two unique positions of a tour, the same as np.random.choice(n, size=2, replace=False)
+in pathGenerator but drawn from the given random generator so runs can be reproduced.
+
+INPUTS
+n: number of points in the tour
+rng: numpy random Generator
 
 OUTPUTS
-bestGuess: the path which best minimizes time elapsed
-bestTime: the best elapsed time after all iterations
-bestTimePerIter: the best elapsed time stored per single iteration
+pivot1, pivot2: two unique positions between 0 and n-1
 """
 
-def annealTime(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost):
+def randomPivots(n, rng):
+    pivot1 = int(rng.integers(n))
+    pivot2 = int(rng.integers(n - 1))
+    if pivot2 >= pivot1: #Skipping over pivot1 so the two pivots are unique
+        pivot2 += 1
+    return pivot1, pivot2
+
+"""
+RandomBlocks is used to draw the random numbers of an annealing chain in blocks. Calling a numpy Generator for a single
+number costs far more than the number itself, so uniform and exponential numbers are drawn a block at a time and handed out
+one by one. It has the random, integers, and standard_exponential methods used by the moves and annealChain, so it can be
+passed anywhere a Generator is. The undrawn part of each block is saved in checkpoints (see saveCheckpoint), so a resumed
+run draws exactly the same numbers as the uninterrupted run. Parallel runs give each replica its own RandomBlocks over an
+independent stream.
+
+INPUTS
+generator: numpy random Generator (or seed) the blocks are drawn from
+blockSize: numbers drawn per block
+
+METHODS
+random(): uniform number in [0, 1)
+integers(low, high): integer in [low, high), or in [0, low) when high is not given
+standard_exponential(): standard exponential number
+"""
+
+class RandomBlocks:
+
+    def __init__(self, generator = None, blockSize = 4096):
+        self.generator = np.random.default_rng(generator)
+        self.blockSize = blockSize
+        self.uniforms, self.nextUniform = [], 0
+        self.exponentials, self.nextExponential = [], 0
+
+    def random(self):
+        if self.nextUniform == len(self.uniforms):
+            self.uniforms, self.nextUniform = self.generator.random(self.blockSize).tolist(), 0
+        self.nextUniform += 1
+        return self.uniforms[self.nextUniform - 1]
+
+    def integers(self, low, high = None):
+        if high is None:
+            low, high = 0, low
+        return low + min(int(self.random() * (high - low)), high - low - 1)
+
+    def standard_exponential(self):
+        if self.nextExponential == len(self.exponentials):
+            self.exponentials, self.nextExponential = self.generator.standard_exponential(self.blockSize).tolist(), 0
+        self.nextExponential += 1
+        return self.exponentials[self.nextExponential - 1]
 
-    bestTimePerIter = []
-    coordinates = np.copy(data)
-    currentGuess = pathGenerator(coordinates)
-    currentTime,currentTimeVec = timeCostCalc(currentGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "time")
-    #Determining the total distance and associated distance vector of the initial guess
+    def remaining(self): #Undrawn numbers of the current blocks
+        return np.array(self.uniforms[self.nextUniform:]), np.array(self.exponentials[self.nextExponential:])
 
-    bestGuess = np.copy(currentGuess) #Determining a placeholder value for best guess
-    bestTime, bestTimeVec = timeCostCalc(bestGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "time")
+    def restore(self, uniforms, exponentials):
+        self.uniforms, self.nextUniform = np.asarray(uniforms, dtype = float).tolist(), 0
+        self.exponentials, self.nextExponential = np.asarray(exponentials, dtype = float).tolist(), 0
+
+"""
+ConvergenceTrace is used to store the best value of an annealing run as it progresses, in preallocated numpy arrays
+instead of a Python list that grows by one float every iteration.
+Samples can be taken every few iterations, at log-spaced iterations, or only when the best value improves. 
+When a file path is given, samples are written to the file (.npy or .csv) whenever the buffer fills, so memory stays bounded
+however long the run is.
+
+INPUTS
+iterations: total number of iterations of the run (iterations are counted from 0)
+mode: "every" samples every iterations that are a multiple of every, "log" samples about points log-spaced iterations,
+"improve" samples each time the best value improves
+every: sampling interval for "every"
+points: number of samples for "log"
+path: optional .npy or .csv file the samples are streamed to
+bufferSize: number of samples held in memory before they are written to path
+
+ATTRIBUTES
+iterations: iterations at which samples were taken (only the samples still in memory when streaming)
+values: best value at each sample (only the samples still in memory when streaming)
+"""
+
+class ConvergenceTrace:
+
+    def __init__(self, iterations, mode = "every", every = 1, points = 200, path = None, bufferSize = 65536):
+        if mode not in ("every", "log", "improve"):
+            raise ValueError("Unknown trace mode: %s" %mode)
+        self.settings = {"iterations": iterations, "mode": mode, "every": every, "points": points}
+        self.mode = mode
+        self.every = max(1, int(every))
+        self.schedule = None
+        if mode == "every":
+            capacity = iterations // self.every
+        elif mode == "log":
+            self.schedule = np.unique(np.geomspace(1, max(iterations, 1), points).astype(np.int64)) - 1
+            capacity = len(self.schedule)
+        else:
+            capacity = 1024 #Grown as needed when not streaming
+        self.path = path
+        if path is not None:
+            capacity = min(capacity, bufferSize)
+        capacity = max(capacity, 1)
+        self.sampleIterations = np.zeros(capacity, dtype = np.int64)
+        self.sampleValues = np.zeros(capacity)
+        self.count = 0 #Samples currently in memory
+        self.written = 0 #Samples already written to path
+        self.file = None
+        if path is not None:
+            self.file = open(path, "wb")
+            self.writeHeader()
+
+    @property
+    def iterations(self):
+        return self.sampleIterations[:self.count]
+
+    @property
+    def values(self):
+        return self.sampleValues[:self.count]
+
+    def nextIteration(self, iteration): #First iteration at or after iteration which should be sampled
+        if self.mode == "every":
+            return iteration + (-(iteration + 1)) % self.every
+        if self.mode == "log":
+            k = np.searchsorted(self.schedule, iteration)
+            return int(self.schedule[k]) if k < len(self.schedule) else -1
+        return -1
+
+    def record(self, iteration, value): #Stores a sample and returns the next iteration which should be sampled
+        if self.count == len(self.sampleValues):
+            if self.file is not None:
+                self.flush()
+            else:
+                self.sampleIterations = np.concatenate((self.sampleIterations, np.zeros_like(self.sampleIterations)))
+                self.sampleValues = np.concatenate((self.sampleValues, np.zeros_like(self.sampleValues)))
+        self.sampleIterations[self.count] = iteration
+        self.sampleValues[self.count] = value
+        self.count += 1
+        return self.nextIteration(iteration + 1)
+
+    def extend(self, iterations, values): #Adds samples taken elsewhere (such as in a worker process)
+        for iteration, value in zip(iterations, values):
+            self.record(int(iteration), float(value))
+
+    def writeHeader(self):
+        if self.path.endswith(".csv"):
+            self.file.write(b"iteration,value\n")
+        else: #npy header for an (written) by 2 float array, padded to a fixed length so it can be rewritten in place at close
+            header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, 2), }" %self.written
+            self.file.seek(0)
+            self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", 118) + header.ljust(117).encode("latin1") + b"\n")
+            self.file.seek(0, 2)
+
+    def flush(self):
+        if self.file is None or self.count == 0:
+            return
+        samples = np.column_stack((self.iterations.astype(float), self.values))
+        if self.path.endswith(".csv"):
+            self.file.write("".join("%d,%r\n" %(int(i), float(v)) for i, v in samples).encode())
+        else:
+            self.file.write(samples.astype("<f8").tobytes())
+        self.written += self.count
+        self.count = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            if not self.path.endswith(".csv"):
+                self.writeHeader()
+            self.file.close()
+            self.file = None
+
+"""
+The following functions make up the adaptive cooling schedule.
+
+sampleDeltas proposes moves from a tour without making them and returns the change in weight of each one.
+
+autoSchedule picks a starting temperature and rate from sampled uphill moves (moves that make the tour worse), so that T and
+rate do not have to be hand tuned for each data set. The starting temperature accepts a typical uphill move (the median of
+the sample, as a few very long moves would skew the mean) with probability startAcceptance, and the rate cools the chain over
+the run to a temperature that accepts a small uphill move (the lowest tenth of the sample) with probability endAcceptance.
+A warm start (a heuristic or earlier tour) starts cooler, accepting a typical uphill move with probability warmAcceptance, so
+the run refines the tour instead of throwing it away. With nearest neighbors, only moves that join a point to one of its
+neighbors are sampled, since the random fallback moves are the ones that are almost never accepted.
+scheduleTemperatures gives the starting and final temperatures themselves, which annealCore uses to fit a deadline.
+
+INPUTS
+weights: n by n numpy array of edge weights
+tour: tour to sample moves from
+iterations: number of iterations of the run
+moves, neighbors: move mix and nearest neighbor array, same as annealChain
+rng: numpy random Generator
+samples: number of moves sampled
+startAcceptance, endAcceptance: acceptance probabilities of an uphill move at the start and the end of the run
+warm: True if tour is a warm start, which uses warmAcceptance at the start instead
+
+OUTPUTS
+deltas: change in weight of each sampled move (sampleDeltas)
+T: starting temperature (autoSchedule and scheduleTemperatures)
+rate: rate of temperature decay (autoSchedule)
+finalT: final temperature, at most T (scheduleTemperatures)
+"""
+
+def candidateMove(edges, neighbors): #True if the move adds an edge from a point to one of its nearest neighbors
+    return any(b in neighbors[a] or a in neighbors[b] for a, b in edges)
+
+def sampleDeltas(weights, tour, moves, neighbors, rng, samples = 200):
+    tour = np.array(tour, dtype = np.int32)
+    n = len(tour)
+    pos = np.zeros(n, dtype = np.int32)
+    pos[tour] = np.arange(n, dtype = np.int32)
+    names, cumulative = moveMix(moves if n >= 5 else "swap")
+    deltas = []
+    for _ in range(4 * samples if neighbors is not None else samples):
+        choice = min(bisect.bisect(cumulative, rng.random()), len(names) - 1)
+        delta, move = moveTypes[names[choice]][0](tour, pos, weights, neighbors, rng)
+        if neighbors is not None and not candidateMove(moveEdges[names[choice]](tour, move)[1].tolist(), neighbors):
+            continue #Random fallback moves (far apart points) are hardly ever accepted and would inflate the temperature
+        deltas.append(delta)
+        if len(deltas) == samples:
+            break
+    return np.array(deltas, dtype = float)
+
+def autoSchedule(weights, tour, iterations, moves = "swap", neighbors = None, rng = None, samples = 200,
+                 startAcceptance = 0.8, endAcceptance = 1e-6, warm = False, warmAcceptance = 0.01):
+    T, finalT = scheduleTemperatures(weights, tour, moves, neighbors, rng, samples, startAcceptance, endAcceptance, warm, warmAcceptance)
+    rate = (min(finalT, T) / T) ** (1.0 / max(iterations, 1))
+    return T, rate
+
+def scheduleTemperatures(weights, tour, moves = "swap", neighbors = None, rng = None, samples = 200,
+                         startAcceptance = 0.8, endAcceptance = 1e-6, warm = False, warmAcceptance = 0.01):
+    rng = np.random.default_rng(rng)
+    if np.isscalar(neighbors):
+        neighbors = nearestNeighbors(weights, neighbors) if neighbors else None
+    deltas = sampleDeltas(weights, tour, moves, neighbors, rng, samples)
+    uphill = deltas[deltas > 0]
+    if len(uphill) == 0: #Every sampled move was an improvement, so any small temperature works
+        return 1.0, 1.0
+    T = -float(np.median(uphill)) / math.log(warmAcceptance if warm else startAcceptance) #The median, as a few huge moves skew the mean
+    finalT = -float(np.percentile(uphill, 10)) / math.log(endAcceptance)
+    return T, min(finalT, T)
+
+"""
+scheduleSettings fills in the settings of the stagnation rules used by annealChain.
+
+INPUT
+schedule: optional dictionary with any of the following settings:
+reheatAfter: iterations without a new best value after which the temperature is raised again (0 turns reheating off)
+reheatFraction: the temperature is raised to this fraction of the starting temperature
+maxReheats: maximum number of reheats in a run
+stopAfter: iterations without a new best value after which the run stops early (0 turns early stopping off)
+
+OUTPUT
+settings: dictionary with every setting
+"""
+
+def scheduleSettings(schedule = None):
+    settings = {"reheatAfter": 0, "reheatFraction": 0.1, "maxReheats": 3, "stopAfter": 0}
+    if schedule:
+        unknown = set(schedule) - set(settings)
+        if unknown:
+            raise ValueError("Unknown schedule settings: %s" %", ".join(sorted(unknown)))
+        settings.update(schedule)
+    return settings
+
+"""
+AnnealProfiler is used to see where the time of an annealing run goes and to watch a run while it is going.
+When a profiler is passed to annealChain, the move functions, the acceptance and move choice draws, and the trace are wrapped
+with timers, so the loop itself is unchanged and a run without a profiler pays nothing for it. Time not spent in a timed phase
+(best value bookkeeping, cooling, and the schedule) is reported as "other".
+annealCore runs the chain in pieces of interval iterations and reports after each piece: the iteration, temperature, current
+and best values, moves per second over the piece, and the proposed, accepted, improving, and uphill accepted moves so far.
+When the run has a lower bound (see lowerBound), the bound and the gap of the best value above it are reported as well.
+Each report is kept in history, passed to the callback, and written as a line of JSON to path.
+
+INPUTS
+interval: iterations between reports
+callback: optional function called with each report (a dictionary)
+path: optional file each report is appended to as a line of JSON
+
+METHODS
+timed(phase, function): function wrapped so its time is added to the phase
+report(state, stats, elapsed, iterations, bound): records a report
+summary(): total seconds of each phase, total moves per second, and the move counts
+"""
+
+class AnnealProfiler:
+
+    def __init__(self, interval = 10000, callback = None, path = None):
+        self.interval = max(1, int(interval))
+        self.callback = callback
+        self.path = path
+        self.phases = {"propose": 0.0, "apply": 0.0, "random": 0.0, "trace": 0.0}
+        self.elapsed = 0.0
+        self.iterations = 0
+        self.counts = {}
+        self.history = []
+
+    def timed(self, phase, function):
+        phases, clock = self.phases, time.perf_counter
+        def timedFunction(*args):
+            start = clock()
+            result = function(*args)
+            phases[phase] += clock() - start
+            return result
+        return timedFunction
+
+    def report(self, state, stats, elapsed, iterations, bound = None):
+        self.elapsed += elapsed
+        self.iterations += iterations
+        self.counts = {key: sum(moveStats.get(key, 0) for moveStats in stats.values()) for key in ("proposed", "accepted", "improved", "uphill")}
+        entry = {"iteration": state["iteration"], "T": float(state["T"]), "value": float(state["value"]), "bestValue": float(state["bestValue"]),
+                 "movesPerSecond": iterations / elapsed if elapsed > 0 else None, "elapsed": self.elapsed}
+        entry.update(self.counts)
+        if bound is not None:
+            entry["bound"], entry["gap"] = float(bound), float(gapAbove(state["bestValue"], bound))
+        self.history.append(entry)
+        if self.callback is not None:
+            self.callback(entry)
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+
+    def summary(self):
+        phases = dict(self.phases)
+        phases["other"] = max(0.0, self.elapsed - sum(self.phases.values()))
+        return {"phases": phases, "elapsed": self.elapsed, "movesPerSecond": self.iterations / self.elapsed if self.elapsed > 0 else None,
+                "counts": dict(self.counts)}
+
+class TimedCalls: #Stands in for an object, timing the given methods as one profiler phase
+
+    def __init__(self, target, profiler, phase, methods):
+        self.target = target
+        for name in methods:
+            setattr(self, name, profiler.timed(phase, getattr(target, name)))
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+"""
+annealState is used to set up the state of an annealing chain, so that a chain can be run in several pieces 
+(such as between replica exchanges in parallelAnneal).
+
+INPUTS
+weights: n by n numpy array of edge weights (such as the output of edgeWeights)
+T: starting temperature of the chain
+tour: optional starting tour of point indices, a random swap of the input order is used if none is given
+rng: numpy random Generator used for the random swap
+
+OUTPUT
+state: dictionary holding the current tour and its position index, the current value, the best tour and value, the temperature,
+the starting temperature, the iteration count, and the stagnation counters used by the schedule
+"""
+
+def annealState(weights, T, tour = None, rng = None):
+    n = len(weights)
+    if tour is None:
+        tour = np.arange(n, dtype = np.int32)
+        if rng is None:
+            tour = pathGenerator(tour) #Creating a first tour guess.
+        else:
+            pivot1, pivot2 = randomPivots(n, rng)
+            tour[pivot1], tour[pivot2] = tour[pivot2], tour[pivot1]
+    else:
+        tour = np.array(tour, dtype = np.int32)
+    value = tourLength(tour, weights) #Determining the total weight of the initial guess
+    pos = np.zeros(n, dtype = np.int32)
+    pos[tour] = np.arange(n, dtype = np.int32) #Position of each point in the tour, used by the moves
+    return {"tour": tour, "pos": pos, "value": value, "bestTour": np.copy(tour), "bestValue": value, "T": T, "T0": T, "iteration": 0,
+            "sinceBest": 0, "reheats": 0, "stopped": False}
+
+"""
+annealChain is used to run an annealing chain forward from its current state. 
+Each iteration proposes a move drawn from the move mix and scores it by looking up only the edges it changes,
+so an iteration costs the same regardless of the number of points. The state dictionary is updated in place.
+A move that raises the weight by delta is accepted when delta < T * E, where E is a standard exponential random number.
+This accepts with the usual probability exp(-delta/T), but never divides by T or takes an exponential, so it cannot
+overflow or divide by zero once the temperature becomes tiny.
+
+INPUTS
+weights: n by n numpy array of edge weights
+state: chain state from annealState
+rate: rate of temperature decay
+iterations: number of iterations to run
+rng: RandomBlocks (or numpy random Generator, whose numbers are then drawn in blocks for this call only)
+trace: ConvergenceTrace the best value is recorded in (or None)
+debugCheck: if nonzero, the running value is checked against a full recalculation every debugCheck iterations
+checkFunction: function of a tour giving its full value for debugCheck, tourLength over weights is used if none is given
+moves: move name or dictionary of move names and relative weights (see moveMix)
+neighbors: optional n by k array of nearest neighbors used to bias the moves
+stats: optional dictionary which is updated with the proposed, accepted, improving, and uphill accepted moves of each move type
+schedule: optional reheating and early stopping settings (see scheduleSettings)
+profiler: optional AnnealProfiler whose phase timers are updated
+
+OUTPUT
+state: the updated chain state
+"""
+
+def annealChain(weights, state, rate, iterations, rng, trace, debugCheck = 0, checkFunction = None,
+                moves = "swap", neighbors = None, stats = None, schedule = None, profiler = None):
+    settings = scheduleSettings(schedule)
+    reheatAfter, stopAfter = settings["reheatAfter"], settings["stopAfter"]
+    if not isinstance(rng, RandomBlocks):
+        rng = RandomBlocks(rng)
+    n = len(weights)
+    if checkFunction is None:
+        checkFunction = lambda checkTour: tourLength(checkTour, weights)
+    names, cumulative = moveMix(moves if n >= 5 else "swap") #Segment moves need at least 5 points
+    moveFunctions = [moveTypes[name] for name in names]
+    counts = [[0, 0, 0, 0] for name in names] #Proposed, accepted, improving, and uphill accepted moves of each type
+    moveRng = rng
+    if profiler is not None: #Timing each phase by wrapping the functions the loop calls, so the loop itself is unchanged
+        moveFunctions = [(profiler.timed("propose", propose), profiler.timed("apply", apply)) for propose, apply in moveFunctions]
+        rng = TimedCalls(rng, profiler, "random", ("random", "standard_exponential"))
+        if trace is not None:
+            trace = TimedCalls(trace, profiler, "trace", ("record",))
+    currentTour = state["tour"]
+    pos = state["pos"]
+    currentValue = state["value"]
+    bestTour = state["bestTour"]
+    bestValue = state["bestValue"]
+    T = state["T"]
+    sinceBest = state.get("sinceBest", 0)
+    reheats = state.get("reheats", 0)
+    start = state["iteration"]
+    done = iterations
+    nextRecord = trace.nextIteration(start) if trace is not None else -1
+    onImprove = trace is not None and trace.mode == "improve"
+    bestIsCurrent = False #True while the current tour is the best tour, which is then only copied when the chain moves away
     
     #Using for loop to go through iterations specified in anneal function:
     for i in range(iterations):
-        newGuess = pathGenerator(currentGuess)
-        newTime,newTimeVec = timeCostCalc(newGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "time")
-        if newTime < currentTime or random.random() < math.exp((currentTime - newTime)/T):
-            currentGuess = newGuess
-            currentTime = newTime
-            if newTime < bestTime:
-                bestTime = currentTime
-                bestTimeVec = currentTimeVec #Updating best guess if current guess is more optimal (less time expensive)
-        bestTimePerIter.append(bestTime) #Updating best guess if current guess is more optimal (less expensive)
+        choice = bisect.bisect(cumulative, rng.random()) if len(names) > 1 else 0
+        propose, apply = moveFunctions[min(choice, len(names) - 1)]
+        delta, move = propose(currentTour, pos, weights, neighbors, moveRng) #Only the edges changed by the move are looked up
+        count = counts[min(choice, len(names) - 1)]
+        count[0] += 1
+        sinceBest += 1
+        if delta <= 0 or delta < T * rng.standard_exponential():
+            #Making acceptance decision based on acceptance probability
+            if bestIsCurrent and not currentValue + delta < bestValue:
+                bestTour = np.copy(currentTour) #Saving the best guess only when the chain is about to leave it
+                bestIsCurrent = False
+            apply(currentTour, pos, move) #Accepting the move in place
+            currentValue = currentValue + delta
+            count[1] += 1
+            if delta < 0:
+                count[2] += 1
+            elif delta > 0:
+                count[3] += 1
+            if currentValue < bestValue:
+                bestValue = currentValue
+                bestIsCurrent = True #Updating best guess if current guess is more optimal, without copying the tour yet
+                sinceBest = 0
+                if onImprove:
+                    trace.record(start + i, bestValue)
+        if start + i == nextRecord:
+            nextRecord = trace.record(start + i, bestValue) #Storing the best guess at the sampled iterations
+
+        if debugCheck and (start + i + 1) % debugCheck == 0: #Checking the running value has not drifted from the true value
+            fullValue = checkFunction(currentTour)
+            if not math.isclose(currentValue, fullValue, rel_tol = 1e-9, abs_tol = 1e-6):
+                raise RuntimeError("Incremental value %f does not match full value %f at iteration %d" %(currentValue, fullValue, start + i + 1))
         
         T = rate * T #Temperature decreases according to exponential rate
-    return bestGuess, bestTime, bestTimePerIter
+        if stopAfter and sinceBest >= stopAfter: #Stopping early once the best value has stopped improving
+            state["stopped"] = True
+            done = i + 1
+            break
+        if reheatAfter and sinceBest and sinceBest % reheatAfter == 0 and reheats < settings["maxReheats"]:
+            T = max(T, settings["reheatFraction"] * state.get("T0", T)) #Reheating to escape a stagnant region
+            reheats += 1
+
+    if bestIsCurrent:
+        bestTour = np.copy(currentTour)
+    state.update(tour = currentTour, value = currentValue, bestTour = bestTour, bestValue = bestValue, T = T, iteration = start + done,
+                 sinceBest = sinceBest, reheats = reheats)
+    if stats is not None:
+        for name, count in zip(names, counts):
+            moveStats = stats.setdefault(name, {"proposed": 0, "accepted": 0, "improved": 0, "uphill": 0})
+            moveStats["proposed"] += count[0]
+            moveStats["accepted"] += count[1]
+            moveStats["improved"] += count[2]
+            moveStats["uphill"] = moveStats.get("uphill", 0) + count[3]
+    return state
 
 """
-annealCost is used to minimize the total cost incurred with the Simulated Annealing method. 
-Multiple parameters are input to determine characteristics of air or land travel.
+saveCheckpoint and loadCheckpoint are used to save the state of an annealing chain to a compact .npz file and to pick the
+chain back up from it. The random generator state is saved with the chain, so a resumed run continues exactly as the
+uninterrupted run would have. The file is written to a temporary name first and then renamed, so a crash while saving
+never leaves a broken checkpoint behind.
+
+INPUTS
+path: checkpoint file (.npz)
+state: chain state from annealState
+rng: RandomBlocks (or numpy random Generator) of the chain, its state and undrawn numbers are saved, or restored in place by loadCheckpoint
+trace: ConvergenceTrace of the chain, samples held in memory are saved and restored with the chain
+
+OUTPUT
+state: chain state read from the checkpoint (loadCheckpoint)
+"""
+
+def saveCheckpoint(path, state, rng, trace = None):
+    generator = rng.generator if isinstance(rng, RandomBlocks) else rng
+    uniforms, exponentials = rng.remaining() if isinstance(rng, RandomBlocks) else (np.zeros(0), np.zeros(0))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        np.savez_compressed(file, tour = state["tour"], bestTour = state["bestTour"],
+                            value = state["value"], bestValue = state["bestValue"], T = state["T"], T0 = state.get("T0", state["T"]),
+                            iteration = state["iteration"], sinceBest = state.get("sinceBest", 0), reheats = state.get("reheats", 0),
+                            stopped = state.get("stopped", False), rate = state.get("rate", np.nan), finalT = state.get("finalT", np.nan),
+                            rngState = json.dumps(generator.bit_generator.state), randomUniforms = uniforms, randomExponentials = exponentials,
+                            traceIterations = trace.iterations if trace is not None else np.zeros(0, dtype = np.int64),
+                            traceValues = trace.values if trace is not None else np.zeros(0))
+    os.replace(temporary, path)
+
+def loadCheckpoint(path, rng, trace = None):
+    with np.load(path) as checkpoint:
+        tour = checkpoint["tour"].astype(np.int32)
+        pos = np.zeros(len(tour), dtype = np.int32)
+        pos[tour] = np.arange(len(tour), dtype = np.int32)
+        state = {"tour": tour, "pos": pos, "value": float(checkpoint["value"]), "bestTour": checkpoint["bestTour"].astype(np.int32),
+                 "bestValue": float(checkpoint["bestValue"]), "T": float(checkpoint["T"]), "T0": float(checkpoint["T0"]),
+                 "iteration": int(checkpoint["iteration"]), "sinceBest": int(checkpoint["sinceBest"]), "reheats": int(checkpoint["reheats"]),
+                 "stopped": bool(checkpoint["stopped"]), "rate": float(checkpoint["rate"]),
+                 "finalT": float(checkpoint["finalT"]) if "finalT" in checkpoint.files else np.nan}
+        generator = rng.generator if isinstance(rng, RandomBlocks) else rng
+        generator.bit_generator.state = json.loads(str(checkpoint["rngState"]))
+        if isinstance(rng, RandomBlocks) and "randomUniforms" in checkpoint.files:
+            rng.restore(checkpoint["randomUniforms"], checkpoint["randomExponentials"])
+        if trace is not None:
+            trace.extend(checkpoint["traceIterations"], checkpoint["traceValues"])
+    return state
+
+"""
+annealCore is the Simulated Annealing run shared by every optimization type. 
+It works on a tour of point indices scored against a precomputed weight matrix.
+
+INPUTS
+weights: n by n numpy array of edge weights (such as the output of edgeWeights)
+T: starting temperature of Simulated Annealing temperature function (exponential decay model), or "auto" (see autoSchedule)
+rate: rate of temperature decay, or "auto" (see autoSchedule)
+iterations: number of iterations ran by simulated annealing optimization
+tour: optional starting tour of point indices, a random swap of the input order is used if none is given
+debugCheck: if nonzero, the running value is checked against a full recalculation every debugCheck iterations
+checkFunction: function of a tour giving its full value for debugCheck, tourLength over weights is used if none is given
+rng: optional numpy random Generator (or seed), so that runs can be reproduced
+moves: move name or dictionary of move names and relative weights (see moveMix)
+neighbors: number of nearest neighbors used to bias the moves (0 for uniformly random moves), or a precomputed neighbor array
+stats: optional dictionary which is updated with the proposed, accepted, improving, and uphill accepted moves of each move type
+trace: optional ConvergenceTrace, the best value of every iteration is stored if none is given
+checkpointPath: optional .npz file the chain state is saved to every checkpointInterval iterations
+checkpointInterval: iterations between checkpoints
+resume: if True and checkpointPath exists, the run continues from the checkpoint instead of starting over
+schedule: optional reheating and early stopping settings (see scheduleSettings)
+profiler: optional AnnealProfiler, which times the phases of the chain and reports every profiler.interval iterations
+deadline: optional time limit in milliseconds. The run stops at the deadline (iterations becomes an upper limit), and the cooling
+rate is refitted as the run goes, from the measured iterations per second, so the temperature reaches the final temperature
+sampled by scheduleTemperatures right at the deadline (or at the iteration limit, if that comes first)
+onBest: optional function called with a copy of the best tour and its value whenever the best value improves, checked every
+1000 iterations (or more often with a deadline)
+bound: optional lower bound on the weight of every tour, or True to find one with lowerBound from the starting tour; the
+profiler then also reports the gap of the best value above it
+targetGap: optional gap at which the run stops early, such as 0.05 to stop once the best value is within 5% of the bound
+(checked every 1000 iterations). If no bound is given, it is found with lowerBound for instances of up to denseLimit points;
+larger instances need an explicit bound (a known value, or True to pay for lowerBound's full graph check)
+
+OUTPUTS
+bestTour: the tour of point indices which best minimizes the weights
+bestValue: the best total weight after all iterations
+bestPerIter: numpy array of the sampled best values (empty if the trace streams to a file)
+"""
+
+def annealCore(weights, T, rate, iterations, tour = None, debugCheck = 0, checkFunction = None, rng = None,
+               moves = "swap", neighbors = 0, stats = None, trace = None, checkpointPath = None, checkpointInterval = 10000,
+               resume = False, schedule = None, profiler = None, deadline = None, onBest = None, bound = None, targetGap = None):
+    if bound is None and targetGap is not None and len(weights) > denseLimit: #Checked before any work, lowerBound takes n**2 time
+        raise ValueError("targetGap needs an explicit bound for instances over %d points (a known lower bound, or bound = True)" %denseLimit)
+    if deadline is not None:
+        end = time.perf_counter() + deadline / 1000
+    rng = np.random.default_rng(rng)
+    draws = RandomBlocks(rng) #The chain draws its numbers in blocks from the same stream
+    if np.isscalar(neighbors):
+        neighbors = nearestNeighbors(weights, neighbors) if neighbors else None
+    if trace is None:
+        trace = ConvergenceTrace(iterations, mode = "log") if deadline is not None else ConvergenceTrace(iterations)
+    if resume and checkpointPath is not None and os.path.exists(checkpointPath):
+        state = loadCheckpoint(checkpointPath, draws, trace)
+        if len(state["tour"]) != len(weights):
+            raise ValueError("Checkpoint %s has %d points, but the data has %d" %(checkpointPath, len(state["tour"]), len(weights)))
+    else:
+        state = annealState(weights, 1.0, tour, rng)
+        if T == "auto" or rate == "auto" or deadline is not None: #Same sample as autoSchedule, a deadline also needs the final temperature
+            autoT, state["finalT"] = scheduleTemperatures(weights, state["tour"], moves, neighbors, rng, warm = tour is not None)
+            if rate == "auto":
+                rate = (state["finalT"] / autoT) ** (1.0 / max(iterations, 1))
+            T = autoT if T == "auto" else T
+        state["T"] = state["T0"] = T
+        state["rate"] = rate
+    if rate == "auto": #Resumed runs keep the rate picked when the run started
+        rate = state["rate"]
+    if profiler is not None and stats is None:
+        stats = {} #Move counts for the profiler reports
+    if bound is True or (bound is None and targetGap is not None): #Finding the lower bound the gap is measured against
+        bound = lowerBound(weights, state["bestValue"], neighbors = 10 if neighbors is None else neighbors, tour = state["bestTour"])
+    pendingTime, pendingIterations = 0.0, 0 #Chain time and iterations since the last profiler report
+    chainTime, chainIterations = 0.0, 0 #Measured speed of the chain, used to fit the schedule to the deadline
+    if deadline is not None:
+        if math.isnan(state.get("finalT", math.nan)): #Resumed from a checkpoint saved without a deadline
+            state["finalT"] = scheduleTemperatures(weights, state["tour"], moves, neighbors, rng, warm = True)[1]
+        finalT = min(state["finalT"], state["T0"]) #Taken from the sampled moves, since T * rate ** iterations is 0 when iterations is only a limit
+    reportedBest = np.inf
+    try:
+        while state["iteration"] < iterations and not state["stopped"]: #Running the chain in pieces between checkpoints and reports
+            stops = [iterations]
+            if checkpointPath is not None:
+                stops.append((state["iteration"] // checkpointInterval + 1) * checkpointInterval)
+            if profiler is not None:
+                stops.append((state["iteration"] // profiler.interval + 1) * profiler.interval)
+            if onBest is not None or targetGap is not None:
+                stops.append((state["iteration"] // 1000 + 1) * 1000)
+            chunk = min(stops) - state["iteration"]
+            if deadline is not None:
+                remaining = end - time.perf_counter()
+                if remaining <= 0:
+                    if profiler is not None and pendingIterations:
+                        profiler.report(state, stats, pendingTime, pendingIterations, bound)
+                    break
+                if chainIterations < 256: #Measuring the speed of the chain on a short first piece
+                    chunk = min(chunk, 256)
+                else:
+                    speed = chainIterations / max(chainTime, 1e-9)
+                    expected = max(1, min(int(speed * remaining), iterations - state["iteration"])) #Iterations left before the deadline or the limit
+                    rate = (finalT / state["T"]) ** (1.0 / expected) if state["T"] > finalT else 1.0
+                    state["rate"] = rate
+                    chunk = min(chunk, expected, max(1, int(speed * max(remaining / 20, 0.002))))
+            start, before = time.perf_counter(), state["iteration"]
+            annealChain(weights, state, rate, chunk, draws, trace, debugCheck, checkFunction, moves, neighbors, stats, schedule, profiler)
+            elapsed = time.perf_counter() - start
+            chainTime += elapsed
+            chainIterations += state["iteration"] - before
+            pendingTime += elapsed
+            pendingIterations += state["iteration"] - before
+            if onBest is not None and state["bestValue"] < reportedBest:
+                reportedBest = state["bestValue"]
+                onBest(np.copy(state["bestTour"]), reportedBest)
+            if targetGap is not None and gapAbove(state["bestValue"], bound) <= targetGap:
+                state["stopped"] = True #Close enough to the best possible tour
+            if profiler is not None and (state["iteration"] % profiler.interval == 0 or state["iteration"] >= iterations or state["stopped"]):
+                profiler.report(state, stats, pendingTime, pendingIterations, bound)
+                pendingTime, pendingIterations = 0.0, 0
+            if checkpointPath is not None and (state["iteration"] % checkpointInterval == 0 or state["iteration"] >= iterations or state["stopped"]):
+                saveCheckpoint(checkpointPath, state, draws, trace)
+    finally:
+        trace.close()
+    return state["bestTour"], state["bestValue"], np.copy(trace.values)
+
+"""
+heldKarp is used to find the exact best tour of a small instance with the Held-Karp dynamic program. Besides replacing
+annealing on small instances, it gives the true optimum to check the annealing heuristics against.
+best[mask, j] is the lowest weight of a path that starts at point 0, visits exactly the points in mask (a bitmask over the
+points 1 to n-1), and ends at point j. Masks are filled in order of their number of points, and for each end point every mask
+of that size is extended at once with numpy, blockSize masks at a time so the temporary arrays stay bounded. The tour is then
+read back from the table, from the last point to the first.
+The table holds 2**(n-1) by n-1 values, so the time and memory double with every point: about 0.3 seconds and 20 MB at 18
+points, and 1 second and 80 MB at 20 points. Any weight matrix works, so distance, time, and cost are solved the same way.
+
+INPUTS
+weights: n by n numpy array of edge weights (such as the output of edgeWeights)
+blockSize: number of masks extended at once
+
+OUTPUTS
+tour: the best tour of point indices, starting at point 0
+value: the total weight of the best tour
+"""
+
+exactLimit = 18 #Largest instance annealOptimization solves exactly with heldKarp
+
+def heldKarp(weights, blockSize = 4096):
+    weights = np.asarray(weights, dtype = float)
+    n = len(weights)
+    if n <= 2: #Only one tour is possible
+        tour = np.arange(n, dtype = np.int32)
+        return tour, tourLength(tour, weights) if n else 0.0
+    m = n - 1 #Points 1 to n-1 are the bits of the masks, point 0 is the start
+    masks = np.arange(1 << m, dtype = np.int64)
+    sizes = np.zeros(1 << m, dtype = np.int8)
+    for j in range(m):
+        sizes += ((masks >> j) & 1).astype(np.int8)
+    inner = weights[1:, 1:]
+    best = np.full((1 << m, m), np.inf)
+    best[1 << np.arange(m), np.arange(m)] = weights[0, 1:] #Paths from point 0 straight to each point
+    for size in range(2, m + 1):
+        layer = masks[sizes == size]
+        for j in range(m):
+            ending = layer[(layer >> j) & 1 == 1]
+            for start in range(0, len(ending), blockSize):
+                block = ending[start:start + blockSize]
+                candidates = np.take(best, block ^ (1 << j), axis = 0) #Paths through the same points without j,
+                candidates += inner[:, j]                                #then extended by the edge to j
+                best[block, j] = candidates.min(axis = 1)
+
+    mask = (1 << m) - 1
+    last = int(np.argmin(best[mask] + weights[1:, 0]))
+    value = float(best[mask, last] + weights[last + 1, 0])
+    tour = np.zeros(n, dtype = np.int32)
+    for k in range(m, 0, -1): #Finding the point before each point of the best path
+        tour[k] = last + 1
+        mask ^= 1 << last
+        if mask:
+            last = int(np.argmin(best[mask] + inner[:, last]))
+    return tour, value
+
+"""
+oneTree is used to find the 1-tree lower bound of a tour. A 1-tree is a spanning tree of the points 1 to n-1 plus the two
+lightest edges from point 0, and every tour is a 1-tree, so the lightest 1-tree weighs no more than the best tour.
+With penalties, every edge (i,j) is weighted w(i,j) + penalties[i] + penalties[j]. A tour uses exactly two edges at every
+point, so this adds 2 * sum(penalties) to every tour, which is subtracted again, and the result is still a lower bound.
+The tree is grown from point 1 with Prim's method over the full graph, one row of weights at a time, so it takes n**2 time but
+only memory proportional to n (rows of a PointWeights are calculated as they are needed).
+
+INPUTS
+weights: n by n numpy array of edge weights (such as the output of edgeWeights), or a PointWeights
+penalties: optional length n numpy array of point penalties
+
+OUTPUTS
+bound: weight of the lightest 1-tree, less twice the sum of the penalties
+degrees: number of 1-tree edges at each point
+"""
+
+def oneTree(weights, penalties = None):
+    n = len(weights)
+    penalties = np.zeros(n) if penalties is None else penalties
+    everything = np.arange(n)
+    def row(point): #Penalized weights from a point to every point
+        values = weights.transform(weights.distanceArray(point, everything)) if isinstance(weights, PointWeights) else weights[point]
+        return np.asarray(values, dtype = float) + penalties[point] + penalties
+    degrees = np.zeros(n, dtype = np.int64)
+    inTree = np.zeros(n, dtype = bool)
+    inTree[:2] = True
+    key = row(1) #Lightest edge from the tree to each point
+    key[inTree] = np.inf
+    parent = np.ones(n, dtype = np.int64)
+    total = 0.0
+    for _ in range(n - 2):
+        point = int(np.argmin(key))
+        total += key[point]
+        degrees[point] += 1
+        degrees[parent[point]] += 1
+        inTree[point] = True
+        key[point] = np.inf
+        values = row(point)
+        closer = (values < key) & ~inTree
+        key[closer] = values[closer]
+        parent[closer] = point
+    ends = row(0)
+    ends[0] = np.inf
+    nearest = np.argpartition(ends, 1)[:2] #The two lightest edges from point 0
+    total += ends[nearest].sum()
+    degrees[nearest] += 1
+    degrees[0] = 2
+    return total - 2 * penalties.sum(), degrees
+
+"""
+spanningForest is used to find the lightest spanning forest of a sparse graph with Boruvka's method. Every round, each
+component picks its lightest edge to another component (ties broken by edge order, so no cycle is formed) and the components
+joined by those edges are merged, so about log2(n) rounds of numpy operations over the edge list are needed.
+
+INPUTS
+n: number of points
+first, second: numpy arrays with the two points of each edge
+values: numpy array with the weight of each edge
+
+OUTPUT
+chosen: boolean numpy array marking the edges in the forest
+"""
+
+def spanningForest(n, first, second, values):
+    order = np.lexsort((np.arange(len(values)), values))
+    rank = np.empty(len(values), dtype = np.int64)
+    rank[order] = np.arange(len(values))
+    chosen = np.zeros(len(values), dtype = bool)
+    label = np.arange(n)
+    while True:
+        a, b = label[first], label[second]
+        cross = np.nonzero(a != b)[0]
+        if len(cross) == 0:
+            return chosen
+        cheapest = np.full(n, len(values))
+        np.minimum.at(cheapest, a[cross], rank[cross])
+        np.minimum.at(cheapest, b[cross], rank[cross])
+        components = np.nonzero(cheapest < len(values))[0]
+        edges = order[cheapest[components]]
+        chosen[edges] = True
+        parent = np.arange(n)
+        parent[components] = np.where(a[edges] == components, b[edges], a[edges])
+        mutual = components[(parent[parent[components]] == components) & (components < parent[components])]
+        parent[mutual] = mutual #Two components that picked the same edge, the smaller one becomes the root
+        while True: #Following the parents up to the root of each merged component
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        label = parent[label]
+
+"""
+lowerBound is used to find how far a tour can be from the best possible tour, as a lower bound on the weight of any tour.
+Without iterations it is the plain 1-tree bound (oneTree). With iterations, the point penalties are raised by subgradient
+steps (the Held-Karp bound): points with more than two 1-tree edges are made heavier and leaves lighter, which pushes the
+1-tree toward a tour and the bound up. Each step only finds the 1-tree of a candidate graph (the nearest neighbor lists plus
+the edges of the given tour, which keep it connected) with spanningForest, so a step takes time proportional to n times the
+neighbor count. The best penalties are then checked with one oneTree over the full graph, so the returned value is a true
+lower bound whatever the candidate graph left out. This last step takes n**2 time (about 2 seconds at 20,000 points, but
+a minute at 50,000), so annealCore only finds a bound on its own up to denseLimit points.
+Step sizes follow the gap between the upper bound and the current bound (at most 10% of the bound), and are halved when
+the bound stops improving. On uniform random points the bound ends up within a few percent of the best tour.
+
+INPUTS
+weights: n by n numpy array of edge weights (such as the output of edgeWeights), or a PointWeights
+upperBound: weight of a known tour, which sizes the steps (the weight of tour is used if none is given)
+iterations: number of subgradient steps (0 for the plain 1-tree bound)
+neighbors: number of nearest neighbors in the candidate graph, or a precomputed neighbor array (see nearestNeighbors)
+tour: optional tour of point indices whose edges are added to the candidate graph, the input order is used if none is given
+patience: steps without a better bound before the step size is halved
+
+OUTPUT
+bound: lower bound on the weight of every tour
+"""
+
+def lowerBound(weights, upperBound = None, iterations = 100, neighbors = 10, tour = None, patience = 5):
+    n = len(weights)
+    if n <= 3: #Only one tour is possible
+        return tourLength(np.arange(n), weights) if n else 0.0
+    if iterations <= 0:
+        return oneTree(weights)[0]
+    if np.isscalar(neighbors):
+        neighbors = nearestNeighbors(weights, neighbors)
+    tour = np.arange(n) if tour is None else np.asarray(tour)
+    upperBound = tourLength(tour, weights) if upperBound is None else upperBound
+    first = np.concatenate((np.repeat(np.arange(n), neighbors.shape[1]), tour))
+    second = np.concatenate((np.asarray(neighbors).ravel(), np.roll(tour, -1)))
+    base = np.asarray(weights[first, second], dtype = float)
+    inner = (first != 0) & (second != 0) #Edges of the spanning tree, the edges at point 0 are added separately
+    startEdges = np.nonzero(~inner)[0]
+    startPoints = np.where(first[startEdges] == 0, second[startEdges], first[startEdges])
+    penalties = np.zeros(n)
+    bestBound, bestPenalties = -np.inf, penalties
+    step, stalled = 2.0, 0
+    for _ in range(iterations):
+        values = base + penalties[first] + penalties[second]
+        chosen = spanningForest(n, first[inner], second[inner], values[inner])
+        order = np.argsort(values[startEdges], kind = "stable")
+        _, firstSeen = np.unique(startPoints[order], return_index = True) #Lightest edge to each point joined to point 0
+        ends = order[np.sort(firstSeen)[:2]]
+        bound = values[inner][chosen].sum() + values[startEdges[ends]].sum() - 2 * penalties.sum()
+        degrees = np.bincount(np.concatenate((first[inner][chosen], second[inner][chosen])), minlength = n)
+        degrees[startPoints[ends]] += 1
+        degrees[0] = 2
+        if bound > bestBound:
+            bestBound, bestPenalties, stalled = bound, penalties, 0
+        else:
+            stalled += 1
+            if stalled >= patience:
+                step, stalled = step / 2, 0
+        slope = degrees - 2
+        if not slope.any(): #The 1-tree is a tour, so no step can raise the bound further
+            break
+        target = min(max(upperBound - bound, 0.0), 0.1 * abs(bound)) #A poor upper bound (such as a random tour) would overshoot
+        penalties = penalties + step * target / float(slope @ slope) * slope
+    return oneTree(weights, bestPenalties)[0]
+
+def gapAbove(value, bound): #Relative gap of a tour value above a lower bound
+    return (value - bound) / abs(bound) if bound else (0.0 if value <= bound else np.inf)
+
+"""
+ResultCache is used to keep the best tours of instances that are solved again and again (such as the same capitals with the
+same air and car parameters), in memory and on disk.
+An instance is keyed by a sha256 hash of its points and its settings (see key). The points are sorted first, so the same set
+of points in any order has the same key, and stored tours are kept in that sorted order and mapped back to the order of the
+caller's points. The settings are written as sorted JSON together with resultCacheVersion, so raising the version
+invalidates every stored result at once.
+The memory tier is a least recently used dictionary of at most memoryEntries results. The disk tier keeps one .npz file
+per result in directory (written to a temporary file of its own and renamed, so readers never see a partial file and
+several processes can share the folder), and the least recently used files beyond diskEntries are deleted. Entries older than maxAge seconds are treated as missing and removed.
+annealOptimization (and annealTour) uses a cache when one is given: with reuse = "return" a stored result is returned without solving, and
+with reuse = "warm" it is used as the starting tour and the result is stored again if it improved.
+
+INPUTS
+directory: optional folder of the disk tier (memory only if none is given)
+memoryEntries: largest number of results kept in memory
+diskEntries: largest number of results kept on disk
+maxAge: optional age in seconds after which a result is no longer used
+reuse: "return" or "warm"
+
+METHODS
+key(data, settings): key of an instance and the order that sorts its points
+get(key): (tour in sorted point order, value) of a stored result, or None
+put(key, tour, value): stores a result
+invalidate(key): removes one result, or every result if no key is given
+"""
+
+resultCacheVersion = 1 #Raised when a change to the solver should invalidate stored results
+
+class ResultCache:
+
+    def __init__(self, directory = None, memoryEntries = 256, diskEntries = 10000, maxAge = None, reuse = "return"):
+        if reuse not in ("return", "warm"):
+            raise ValueError("Unknown cache reuse: %s" %reuse)
+        self.directory = directory
+        self.memoryEntries, self.diskEntries, self.maxAge, self.reuse = memoryEntries, diskEntries, maxAge, reuse
+        self.memory = collections.OrderedDict()
+        self.counts = {"memory": 0, "disk": 0, "miss": 0}
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def key(self, data, settings):
+        points = np.ascontiguousarray(data, dtype = float)
+        order = np.lexsort((points[:, 1], points[:, 0]))
+        text = json.dumps({"version": resultCacheVersion, "settings": settings}, sort_keys = True, default = str)
+        return hashlib.sha256(points[order].tobytes() + text.encode()).hexdigest(), order
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def modified(self, path): #Time a stored file was last used, files removed by another process sort first
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    def fresh(self, created):
+        return self.maxAge is None or time.time() - created <= self.maxAge
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memoryEntries: #Evicting the least recently used result
+            self.memory.popitem(last = False)
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None and self.fresh(entry[2]):
+            self.memory.move_to_end(key)
+            self.counts["memory"] += 1
+            return entry[0], entry[1]
+        self.memory.pop(key, None)
+        if self.directory is not None and os.path.exists(self.path(key)):
+            try:
+                with np.load(self.path(key)) as stored:
+                    entry = (stored["tour"].astype(np.int32), float(stored["value"]), float(stored["created"]))
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile): #Removed or unreadable, the same as missing
+                entry = None
+            if entry is not None and self.fresh(entry[2]):
+                with contextlib.suppress(OSError): #Marking the file as recently used, unless another process removed it
+                    os.utime(self.path(key))
+                self.remember(key, entry)
+                self.counts["disk"] += 1
+                return entry[0], entry[1]
+            self.invalidate(key)
+        self.counts["miss"] += 1
+        return None
+
+    def put(self, key, tour, value):
+        entry = (np.asarray(tour, dtype = np.int32), float(value), time.time())
+        self.remember(key, entry)
+        if self.directory is None:
+            return
+        handle, temporary = tempfile.mkstemp(suffix = ".tmp", dir = self.directory) #Unique to this writer, so processes sharing the folder never write the same file
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez(file, tour = entry[0], value = entry[1], created = entry[2])
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporary)
+            raise
+        stored = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".npz")]
+        if len(stored) > self.diskEntries:
+            stored.sort(key = lambda path: self.modified(path))
+            for path in stored[:len(stored) - self.diskEntries]:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+
+    def invalidate(self, key = None):
+        keys = [key] if key is not None else list(self.memory)
+        if key is None and self.directory is not None:
+            keys += [name[:-4] for name in os.listdir(self.directory) if name.endswith(".npz")]
+        for key in keys:
+            self.memory.pop(key, None)
+            if self.directory is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(self.path(key))
+
+"""
+cacheSettings is used to build the solver settings that are part of a ResultCache key, so every caller (annealTour and the
+batch mode) keys the same instance and settings the same way. The air and car parameters are only included for the time and
+cost objectives, and a warm start tour is keyed as "tour".
+
+INPUTS
+optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric: objective and distance settings, same as annealOptimization
+T, rate, iterations, moves, neighbors, initial, schedule, exact, deadline, targetGap: solver settings, same as annealOptimization
+seed: integer seed of the run
+
+OUTPUT
+settings: dictionary of the settings, written into the key by ResultCache.key
+"""
+
+def cacheSettings(optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric, T, rate, iterations, moves, neighbors,
+                  initial, schedule, exact, deadline, targetGap, seed):
+    settings = {"optimizationType": optimizationType, "metric": metric, "T": T, "rate": rate, "iterations": iterations,
+                "moves": moves, "neighbors": neighbors, "initial": initial if initial is None or isinstance(initial, str) else "tour",
+                "schedule": schedule, "exact": exact, "deadline": deadline, "targetGap": targetGap, "seed": int(seed)}
+    if optimizationType != "distance": #The air and car parameters only change time and cost
+        settings.update({"airCriteria": airCriteria, "airSpeed": airSpeed, "airCost": airCost, "carSpeed": carSpeed, "carCost": carCost})
+    return settings
+
+"""
+annealDistance, annealTime, and annealCost are used to minimize the total distance, time, or cost with the Simulated Annealing method.
+They are kept for convenience and call annealOptimization with the matching optimization type.
 
 INPUTS
 data: the path through which the salesman travels, which is a n by 2 numpy array
@@ -225,74 +2082,948 @@ carSpeed: average speed of car travel, measured in mph
 carCost: cost of car travel, measured in dollars per hour
 
 OUTPUTS
-bestGuess: the path which best minimizes cost
-bestCost: the best incurred cost after all iterations
-bestCostPerIter: the best incurred cost stored per single iteration
+bestGuess: the path which best minimizes distance, time, or cost
+bestValue: the best distance, time, or cost after all iterations
+bestPerIter: the best distance, time, or cost stored per single iteration
 """
 
-def annealCost(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost):
+def annealDistance(data, T, rate, iterations, debugCheck = 0):
+    return annealOptimization(data, T, rate, iterations, None, None, None, None, None, "distance", debugCheck = debugCheck)
 
-    bestCostPerIter = []
-    coordinates = np.copy(data)
-    currentGuess = pathGenerator(coordinates)
-    currentCost,currentCostVec = timeCostCalc(currentGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "cost")
-    #Determining the total distance and associated distance vector of the initial guess
+def annealTime(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost):
+    return annealOptimization(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost, "time")
 
-    bestGuess = np.copy(currentGuess) #Determining a placeholder value for best guess
-    bestCost, bestCostVec = timeCostCalc(bestGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "cost")
-    
-    #Using for loop to go through iterations specified in anneal function:
-    for i in range(iterations):
-        newGuess = pathGenerator(currentGuess)
-        newCost,newCostVec = timeCostCalc(newGuess,airCriteria,airSpeed,airCost,carSpeed,carCost, "cost")
-        if newCost < currentCost or random.random() < math.exp((currentCost - newCost)/T): 
-            #Making acceptance decision based on acceptance probability
-            currentGuess = newGuess
-            currentCost = newCost #Swapping between current guess and new guess
-            if newCost < bestCost:
-                bestCost = currentCost
-                bestCostVec = currentCostVec #Updating best guess if current guess is more optimal (less expensive)
-        
-        bestCostPerIter.append(bestCost) #Storing the best guess per iteration
-        
-        T = rate * T #Temperature decreases according to exponential rate
-    return bestGuess, bestCost, bestCostPerIter
+def annealCost(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost):
+    return annealOptimization(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost, "cost")
 
 """
 annealOptimization is used to conveniently store all optimization features, and determines which one is being called. 
 Multiple parameters are input to determine characteristics of air or land travel.
+The weights for the chosen optimization type are built once with edgeWeights and minimized with annealCore.
 
 INPUTS
 data: the path through which the salesman travels, which is a n by 2 numpy array
-T: starting temperature of Simulated Annealing temperature function (exponential decay model)
-rate: rate of temperature decay
+T: starting temperature of Simulated Annealing temperature function (exponential decay model), or "auto" to pick it from sampled moves
+rate: rate of temperature decay, or "auto" to pick it so the run cools over the given iterations
 iterations: number of iterations ran by simulated annealing optimization
 airCriteria: maximum distance in miles salesman is willing to drive
 airSpeed: average speed of air travel, measured in mph
 airCost: cost of air travel, measured in dollars per hour
 carSpeed: average speed of car travel, measured in mph
 carCost: cost of car travel, measured in dollars per hour
-optimizationType: used to switch between which values are returned by timeCostCalc
-"time" returns time related information
+optimizationType: used to switch between which quantity is minimized
+"distance" returns distance related information
 "time" returns time related information
 "cost" returns cost related information
+debugCheck: if nonzero, the running value is checked against distanceCalc or timeCostCalc (or tourLength for the spherical metrics)
+every debugCheck iterations
+moves: move name ("swap", "2opt", "oropt", or "3opt") or dictionary of move names and relative weights, such as {"2opt": 0.7, "oropt": 0.3}
+neighbors: number of nearest neighbors used to bias the moves (0 for uniformly random moves)
+stats: optional dictionary which is filled with the proposed, accepted, improving, and uphill accepted moves of each move type
+initial: starting tour, either the name of a heuristic ("nearest", "greedy", "spacefill", "insertion", see initialTour)
+or a warm start tour of point indices. A random swap of the input order is used if none is given.
+trace: optional ConvergenceTrace to sample the best value less often or stream it to a file (see ConvergenceTrace),
+the best value of every iteration is stored if none is given
+checkpointPath, checkpointInterval, resume: periodic checkpoints of the run and resuming from them (see annealCore)
+schedule: optional dictionary of reheating and early stopping settings, such as {"reheatAfter": 2000, "stopAfter": 10000}
+(see scheduleSettings)
+metric: distance metric, "planar" (the original conversion), "equirectangular", or "haversine" (see distanceMatrix)
+cacheDirectory: optional folder the distance matrix is cached in, so repeated runs over the same points skip building it
+profiler: optional AnnealProfiler for phase timings, move counts, moves per second, and live reports of the temperature and best value
+(see AnnealProfiler), such as AnnealProfiler(interval = 1000, callback = print)
+deadline: optional time limit of the whole call in milliseconds, after which the best path found so far is returned; the cooling
+schedule is stretched or squeezed to fit the time (see annealCore), and iterations becomes an upper limit
+onBest: optional function called with the best tour (point indices) and its value each time a better path is found
+exact: True to solve exactly with heldKarp instead of annealing, False to always anneal; by default instances of up to
+exactLimit points are solved exactly (unless resuming)
+bound: optional lower bound on the value of every path, or True to find one with lowerBound, so the profiler reports the gap
+of the best value above it
+targetGap: optional gap above the lower bound at which the run stops, such as 0.05 to stop within 5% of the best possible path
+(instances over denseLimit points need an explicit bound, see annealCore)
+cache: optional ResultCache, which returns a stored result of the same points and settings without solving (or warm starts
+from it), and stores the new result. Only seeded runs (rng given as a number) use the cache, since two unseeded runs are
+meant to be independent. When a stored result is returned, onBest is called once with it, stats gets "cached": True, and
+no moves or profiler reports are made
+rng: optional numpy random Generator (or seed) used for the starting tour and the run, so that runs can be reproduced
 
 OUTPUTS
-return values given by simulated annealing functions
+bestGuess: the path which best minimizes the chosen quantity, which is a n by 2 numpy array
+bestValue: the best distance, time, or cost after all iterations
+bestPerIter: the best distance, time, or cost stored per single iteration (only the exact value when solved with heldKarp)
+
+annealTour takes the same inputs and returns the best tour as point indices (bestTour) in place of bestGuess, for callers
+such as the batch mode that report the visiting order.
 """
 
-def annealOptimization(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost, optimizationType):
-    #Based on optimization 
-    if optimizationType == "distance":
-        return annealDistance(data, T, rate, iterations)
-    elif optimizationType == "cost":
-        return annealCost(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost)
-    elif optimizationType == "time":
-        return annealTime(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost)
+def annealOptimization(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost, optimizationType, debugCheck = 0,
+                       moves = "swap", neighbors = 0, stats = None, initial = None, trace = None,
+                       checkpointPath = None, checkpointInterval = 10000, resume = False, schedule = None, metric = "planar",
+                       cacheDirectory = None, profiler = None, deadline = None, onBest = None, exact = None, bound = None,
+                       targetGap = None, cache = None, rng = None):
+    coordinates = np.asarray(data)
+    bestTour, bestValue, bestPerIter = annealTour(coordinates, T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost,
+                                                  optimizationType, debugCheck = debugCheck, moves = moves, neighbors = neighbors,
+                                                  stats = stats, initial = initial, trace = trace, checkpointPath = checkpointPath,
+                                                  checkpointInterval = checkpointInterval, resume = resume, schedule = schedule,
+                                                  metric = metric, cacheDirectory = cacheDirectory, profiler = profiler, deadline = deadline,
+                                                  onBest = onBest, exact = exact, bound = bound, targetGap = targetGap, cache = cache, rng = rng)
+    bestGuess = coordinates[bestTour] #Building the coordinate path only once, from the best tour
+    return bestGuess, bestValue, bestPerIter
+
+def annealTour(data, T, rate, iterations,airSpeed,airCriteria,airCost,carSpeed,carCost, optimizationType, debugCheck = 0,
+               moves = "swap", neighbors = 0, stats = None, initial = None, trace = None,
+               checkpointPath = None, checkpointInterval = 10000, resume = False, schedule = None, metric = "planar",
+               cacheDirectory = None, profiler = None, deadline = None, onBest = None, exact = None, bound = None,
+               targetGap = None, cache = None, rng = None):
+    start = time.perf_counter()
+    coordinates = np.asarray(data)
+    if not isinstance(rng, (int, np.integer)): #Unseeded runs are independent random runs, which a stored result would replace
+        cache = None
+    if cache is not None:
+        settings = cacheSettings(optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric, T, rate, iterations,
+                                 moves, neighbors, initial, schedule, exact, deadline, targetGap, rng)
+        key, order = cache.key(coordinates, settings)
+        cached = cache.get(key)
+        if cached is not None:
+            if cache.reuse == "return":
+                bestTour = order[cached[0]]
+                if stats is not None:
+                    stats["cached"] = True #Telling the caller the result was not annealed
+                if onBest is not None:
+                    onBest(np.copy(bestTour), cached[1])
+                return bestTour, cached[1], np.array([cached[1]])
+            initial = order[cached[0]] #Warm start from the stored tour
+    rng = np.random.default_rng(rng) #One stream for the starting tour and the run
+    weights = edgeWeights(coordinates, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric, cacheDirectory)
+    if exact is None:
+        exact = len(coordinates) <= exactLimit and not resume
+    if exact: #Small instances are solved exactly instead of annealed
+        bestTour, bestValue = heldKarp(weights)
+        if onBest is not None:
+            onBest(np.copy(bestTour), bestValue)
+        if trace is None:
+            bestPerIter = np.array([bestValue])
+        else:
+            trace.record(0, bestValue)
+            trace.close()
+            bestPerIter = np.copy(trace.values)
+    else:
+        tour = initialTour(coordinates, initial, rng) if isinstance(initial, str) else initial
+        #The original full calculations are used to check the incremental values in debug mode
+        if metric != "planar" or isinstance(weights, PointWeights): #The original calculations only use the planar conversion of the
+            checkFunction = None                                          #full precision coordinates, so the full tour length is checked instead
+        elif optimizationType == "distance":
+            checkFunction = lambda tour: distanceCalc(coordinates[tour])[0]
+        else:
+            checkFunction = lambda tour: timeCostCalc(coordinates[tour], airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType)[0]
+        bestTour, bestValue, bestPerIter = annealCore(weights, T, rate, iterations, tour, debugCheck = debugCheck, checkFunction = checkFunction,
+                                                      rng = rng, moves = moves, neighbors = neighbors, stats = stats, trace = trace,
+                                                      checkpointPath = checkpointPath, checkpointInterval = checkpointInterval, resume = resume,
+                                                      schedule = schedule, profiler = profiler, onBest = onBest, bound = bound, targetGap = targetGap,
+                                                      deadline = None if deadline is None else deadline - 1000 * (time.perf_counter() - start))
+    if cache is not None and (cached is None or bestValue < cached[1]):
+        cache.put(key, np.argsort(order)[bestTour], bestValue) #Stored in the sorted order of the points
+    return bestTour, bestValue, bestPerIter
+
+"""
+objectiveStack is used to build the distance, time, and cost weights of every edge together from a single distance matrix,
+with the same air or car choice as edgeWeights. Like edgeWeights, instances over denseLimit points get a PointStack instead
+(the n by n by 3 array of 100,000 points would need 240 GB).
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+airCriteria, airSpeed, airCost, carSpeed, carCost, metric, cacheDirectory: same as edgeWeights
+
+OUTPUT
+stack: n by n by 3 numpy array where stack[i,j] holds the distance, time, and cost of traveling from point i to point j
+(a PointStack calculating them on demand for instances over denseLimit points)
+"""
+
+objectiveNames = ["distance", "time", "cost"]
+
+def objectiveStack(data, airCriteria, airSpeed, airCost, carSpeed, carCost, metric = "planar", cacheDirectory = None):
+    if len(data) > denseLimit:
+        return PointStack(data, airCriteria, airSpeed, airCost, carSpeed, carCost, metric)
+    distances = distanceMatrix(data, metric, cacheDirectory)
+    fly = distances > airCriteria
+    stack = np.empty(distances.shape + (3,))
+    stack[:,:,0] = distances
+    stack[:,:,1] = np.where(fly, distances/airSpeed, distances/carSpeed)
+    stack[:,:,2] = np.where(fly, distances * airCost, distances * carCost)
+    return stack
+
+"""
+PointStack is used in place of the objectiveStack array for large instances, the same way PointWeights replaces the weight
+matrix. stack[:,:,k] gives the PointWeights of objective k, and stack[a, b] for arrays of points gives their distance, time,
+and cost along a last axis of length 3, calculating each distance only once.
+
+INPUTS
+data, airCriteria, airSpeed, airCost, carSpeed, carCost, metric: same as objectiveStack
+"""
+
+class PointStack:
+
+    def __init__(self, data, airCriteria, airSpeed, airCost, carSpeed, carCost, metric = "planar"):
+        self.objectives = [PointWeights(data, name, airCriteria, airSpeed, airCost, carSpeed, carCost, metric) for name in objectiveNames]
+        self.shape = self.objectives[0].shape + (3,)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if len(key) == 3: #One objective, such as stack[:,:,0]
+            return self.objectives[key[2]]
+        distances = self.objectives[0].distanceArray(*key)
+        return np.stack([weights.transform(distances) for weights in self.objectives], axis = -1)
+
+"""
+paretoArchive is used to add a tour to an archive of non-dominated tours. A tour dominates another if it is no worse in
+distance, time, and cost, and better in at least one of them. When the archive is over its size limit, the entry with the
+closest neighbors in normalized objective space (the most crowded) is dropped, except for the best entry of each objective.
+
+INPUTS
+archiveValues: list of length 3 numpy arrays with the distance, time, and cost of each archived tour
+archiveTours: list of archived tours (same order as archiveValues)
+values: distance, time, and cost of the new tour
+tour: the new tour (copied if it is added)
+archiveSize: maximum number of archived tours
+
+OUTPUT
+added: True if the tour was added to the archive
+"""
+
+def paretoArchive(archiveValues, archiveTours, values, tour, archiveSize):
+    if archiveValues:
+        front = np.array(archiveValues)
+        if np.any(np.all(front <= values, axis = 1)): #Dominated by (or equal to) an archived tour
+            return False
+        keep = ~np.all(values <= front, axis = 1) #Dropping the archived tours the new tour dominates
+        archiveValues[:] = [archiveValues[k] for k in np.nonzero(keep)[0]]
+        archiveTours[:] = [archiveTours[k] for k in np.nonzero(keep)[0]]
+    archiveValues.append(np.array(values, dtype = float))
+    archiveTours.append(np.copy(tour))
+    if len(archiveValues) > archiveSize:
+        front = np.array(archiveValues)
+        spread = np.maximum(front.max(axis = 0) - front.min(axis = 0), 1e-12)
+        normalized = (front - front.min(axis = 0)) / spread
+        gaps = np.sqrt(((normalized[:, np.newaxis, :] - normalized[np.newaxis, :, :]) ** 2).sum(axis = 2))
+        np.fill_diagonal(gaps, np.inf)
+        crowding = gaps.min(axis = 1)
+        crowding[np.argmin(front, axis = 0)] = np.inf #The best tour of each objective is always kept
+        drop = int(np.argmin(crowding))
+        del archiveValues[drop]
+        del archiveTours[drop]
+    return True
+
+"""
+paretoAnneal is used to optimize distance, time, and cost in a single Simulated Annealing run.
+Moves are picked on distance, and every proposed move is scored on a weighted sum of the changes of the three objectives,
+looked up from the edges it changes (objectiveStack and moveEdges), so no weighted matrix is ever built and a move costs the
+same however often the weights are redrawn. Accepted moves update all three objectives together. Every tour the chain visits
+is offered to an archive of non-dominated tours, so the run returns the Pareto front of distance, time, and cost.
+Objectives are rescaled by the starting tour so that each is measured in distance units, which keeps T on the same scale as
+a distance run (and an "auto" T or rate is picked from sampled distance moves). Without a scalarization the weighted sum
+is redrawn at random every weightInterval iterations, which spreads the chain along the front; with a scalarization the
+weights stay fixed.
+
+INPUTS
+data: the path through which the salesman travels, which is a n by 2 numpy array
+T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost: same as annealOptimization
+scalarization: optional fixed weights of distance, time, and cost, such as (1, 0, 0.5)
+weightInterval: iterations between random weight draws when no scalarization is given
+archiveSize: maximum number of tours kept on the front
+moves, neighbors, initial: move mix, nearest neighbor count, and starting tour, same as annealOptimization
+rng: optional numpy random Generator (or seed)
+metric, cacheDirectory: distance metric and distance matrix cache, same as annealOptimization
+
+OUTPUTS
+paretoPaths: list of paths on the front, each a n by 2 numpy array, ordered by increasing distance
+paretoValues: m by 3 numpy array with the distance, time, and cost of each path on the front
+"""
+
+def paretoAnneal(data, T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost, scalarization = None,
+                 weightInterval = 100, archiveSize = 100, moves = "swap", neighbors = 0, initial = None, rng = None, metric = "planar",
+                 cacheDirectory = None):
+    rng = np.random.default_rng(rng)
+    coordinates = np.asarray(data)
+    stack = objectiveStack(coordinates, airCriteria, airSpeed, airCost, carSpeed, carCost, metric, cacheDirectory)
+    n = len(coordinates)
+    tour = initialTour(coordinates, initial, rng) if isinstance(initial, str) else initial
+    distances = stack[:,:,0] #Moves are proposed on distance and scored on all three objectives
+    state = annealState(distances, 1.0, tour, rng)
+    currentTour, pos = state["tour"], state["pos"]
+    currentValues = np.array([tourLength(currentTour, stack[:,:,k]) for k in range(3)])
+    scale = currentValues[0] / np.maximum(currentValues, 1e-12) #Measuring every objective in distance units
+    names, cumulative = moveMix(moves if n >= 5 else "swap")
+    mix = None
+    if neighbors: #Neighbors by distance are used for every objective
+        neighbors = nearestNeighbors(distances, neighbors)
+    else:
+        neighbors = None
+    if T == "auto" or rate == "auto":
+        autoT, autoRate = autoSchedule(distances, currentTour, iterations, moves, neighbors, rng, warm = tour is not None)
+        T = autoT if T == "auto" else T
+        rate = autoRate if rate == "auto" else rate
+
+    archiveValues, archiveTours = [], []
+    paretoArchive(archiveValues, archiveTours, currentValues, currentTour, archiveSize)
+    draws = RandomBlocks(rng) #Numbers for the moves and acceptance tests are drawn in blocks
+    for i in range(iterations):
+        if mix is None or (scalarization is None and i % weightInterval == 0):
+            mix = np.asarray(scalarization, dtype = float) if scalarization is not None else rng.dirichlet(np.ones(3))
+            mix = mix * scale
+        choice = min(bisect.bisect(cumulative, draws.random()), len(names) - 1) if len(names) > 1 else 0
+        propose, apply = moveTypes[names[choice]]
+        move = propose(currentTour, pos, distances, neighbors, draws)[1]
+        removed, added = moveEdges[names[choice]](currentTour, move)
+        changes = stack[added[:,0], added[:,1]].sum(axis = 0) - stack[removed[:,0], removed[:,1]].sum(axis = 0) #Change of each objective
+        delta = float(mix @ changes) #Weighted sum of the objectives, in distance units
+        if delta <= 0 or delta < T * draws.standard_exponential(): #Same acceptance rule as annealChain
+            currentValues = currentValues + changes
+            apply(currentTour, pos, move)
+            paretoArchive(archiveValues, archiveTours, currentValues, currentTour, archiveSize)
+        T = rate * T #Temperature decreases according to exponential rate
+
+    order = np.argsort([values[0] for values in archiveValues])
+    paretoPaths = [coordinates[archiveTours[k]] for k in order]
+    paretoValues = np.array([archiveValues[k] for k in order])
+    return paretoPaths, paretoValues
+
+"""
+The following functions run several annealing chains at once in a process pool (see parallelAnneal).
+The weight matrix is placed in shared memory once, and each worker process attaches to it when it starts 
+instead of receiving its own pickled copy with every task.
+"""
+
+workerArrays = {} #Shared arrays attached by each worker process, keyed by name
+
+def shareArray(array):
+    block = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)
+    view[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+def parallelWorkerInit(specs, pointSettings = None):
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name = name) #Only the parent process unlinks the block when the run ends
+        workerArrays[key] = (block, np.ndarray(shape, dtype = dtype, buffer = block.buf))
+    if pointSettings is not None: #Large instances share their coordinates, and each worker calculates weights on demand
+        block, points = workerArrays.pop("points")
+        workerArrays["weights"] = (block, PointWeights(points, **pointSettings))
+
+@contextlib.contextmanager
+def sharedWeights(weights, neighbors): #Places the weights and neighbor lists in shared memory, giving what parallelWorkerInit needs to attach them
+    blocks = []
+    specs = {}
+    sharedArrays = {"points": weights.points} if isinstance(weights, PointWeights) else {"weights": weights}
+    pointSettings = weights.settings if isinstance(weights, PointWeights) else None
+    if neighbors is not None:
+        sharedArrays["neighbors"] = neighbors
+    try:
+        for key, array in sharedArrays.items():
+            block, specs[key] = shareArray(array)
+            blocks.append(block)
+        yield specs, pointSettings
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+@contextlib.contextmanager
+def sharedPool(weights, neighbors, workers): #Process pool whose workers share the weights and neighbor lists
+    with sharedWeights(weights, neighbors) as (specs, pointSettings):
+        with multiprocessing.Pool(workers, initializer = parallelWorkerInit, initargs = (specs, pointSettings)) as pool:
+            yield pool
+
+def workerNeighbors():
+    return workerArrays["neighbors"][1] if "neighbors" in workerArrays else None
+
+def restartWorker(task):
+    T, rate, iterations, seed, moves, tour, traceSettings = task
+    weights = workerArrays["weights"][1]
+    bestTour, bestValue, bestPerIter = annealCore(weights, T, rate, iterations, tour, rng = np.random.default_rng(seed),
+                                                  moves = moves, neighbors = workerNeighbors(), trace = ConvergenceTrace(**traceSettings))
+    return bestTour, bestValue, bestPerIter
+
+def temperingWorker(connection, specs, pointSettings, seeds, temperatures, tour, moves, traceSettings):
+    parallelWorkerInit(specs, pointSettings)
+    weights, neighbors = workerArrays["weights"][1], workerNeighbors()
+    replicas = {} #State, random stream, and trace of each replica held by this process, which stay here for the whole run
+    for replica, seed in seeds.items():
+        rng = RandomBlocks(seed)
+        replicas[replica] = (annealState(weights, temperatures[replica], tour, rng), rng, ConvergenceTrace(**traceSettings))
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            temperatures, rate, iterations = message
+            for replica, T in temperatures.items():
+                state, rng, trace = replicas[replica]
+                state["T"] = T
+                chunkTrace = ConvergenceTrace(**traceSettings)
+                annealChain(weights, state, rate, iterations, rng, chunkTrace, moves = moves, neighbors = neighbors) #The whole ladder cools at the same rate
+                trace.extend(chunkTrace.iterations, chunkTrace.values)
+            connection.send({replica: replicas[replica][0]["value"] for replica in temperatures}) #Only the values are needed for the exchanges
+        connection.send({replica: (state["bestTour"], state["bestValue"], np.copy(trace.values)) for replica, (state, _, trace) in replicas.items()})
+    finally:
+        connection.close()
+
+"""
+parallelAnneal is used to run several Simulated Annealing chains across CPU cores and return the best path found by any of them.
+Two modes are available:
+"restarts" runs independent chains from different random starting guesses.
+"tempering" runs a parallel tempering ladder: the replicas are spaced geometrically from T down to T / 2, the whole ladder
+cools at rate like a single chain, and neighboring replicas exchange paths every exchangeInterval iterations with the
+standard Metropolis exchange probability, so better paths move down to the colder replicas.
+Results only depend on seed, so the same seed and worker count always give the same paths.
+
+INPUTS
+data: the path through which the salesman travels, which is a n by 2 numpy array
+T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType: same as annealOptimization (including "auto")
+replicas: number of chains
+workers: number of worker processes, defaults to the smaller of replicas and the CPU count
+mode: "restarts" or "tempering"
+exchangeInterval: iterations between replica exchanges in "tempering" mode
+seed: seed used to create an independent random stream for each replica
+moves, neighbors, initial: move mix, nearest neighbor count, and starting tour, same as annealOptimization
+traceMode, traceEvery, tracePoints: sampling of the replica traces (mode, every, and points of ConvergenceTrace)
+metric, cacheDirectory: distance metric and distance matrix cache, same as annealOptimization
+
+OUTPUTS
+bestGuess: the best path found by any replica
+bestValue: the best distance, time, or cost found by any replica
+replicaTraces: list with the sampled best values of each replica
+"""
+
+def parallelAnneal(data, T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType,
+                   replicas = 4, workers = None, mode = "restarts", exchangeInterval = 1000, seed = None, moves = "swap", neighbors = 0,
+                   initial = None, traceMode = "every", traceEvery = 1, tracePoints = 200, metric = "planar", cacheDirectory = None):
+    coordinates = np.asarray(data)
+    weights = edgeWeights(coordinates, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric, cacheDirectory)
+    if workers is None:
+        workers = min(replicas, os.cpu_count() or 1)
+    seeds = np.random.SeedSequence(seed).spawn(replicas + 3) #One stream per replica, plus one each for replica exchanges, the schedule, and the starting tour
+    tour = initialTour(coordinates, initial, np.random.default_rng(seeds[replicas + 2])) if isinstance(initial, str) else initial
+    candidates = nearestNeighbors(weights, neighbors) if neighbors else None #Built once and shared, like the weights
+    if T == "auto" or rate == "auto": #Picking the schedule once in the parent so every replica shares it
+        scheduleRng = np.random.default_rng(seeds[replicas + 1])
+        sampleTour = annealState(weights, 1.0, tour, scheduleRng)["tour"]
+        autoT, autoRate = autoSchedule(weights, sampleTour, iterations, moves, candidates, scheduleRng, warm = tour is not None)
+        T = autoT if T == "auto" else T
+        rate = autoRate if rate == "auto" else rate
+    traceSettings = {"iterations": iterations, "mode": traceMode, "every": traceEvery, "points": tracePoints}
+
+    if mode == "restarts":
+        with sharedPool(weights, candidates, workers) as pool:
+            tasks = [(T, rate, iterations, seeds[k], moves, tour, traceSettings) for k in range(replicas)]
+            results = pool.map(restartWorker, tasks)
+        replicaTraces = [result[2] for result in results]
+        bestTour, bestValue, _ = min(results, key = lambda result: result[1])
+    elif mode == "tempering":
+        bestTour, bestValue, replicaTraces = temperingLadder(weights, candidates, workers, T, rate, iterations, replicas, exchangeInterval,
+                                                             seeds, moves, tour, traceSettings)
+    else:
+        raise ValueError("Unknown parallel mode: %s" %mode)
+    bestGuess = coordinates[bestTour] #Building the coordinate path only once, from the best tour
+    return bestGuess, bestValue, replicaTraces
+
+"""
+temperingLadder runs the "tempering" mode of parallelAnneal.
+The replicas are split between worker processes, which attach to the shared weights and keep their replicas' paths,
+random streams, and traces for the whole run. Replicas are run for exchangeInterval iterations at a time, and exchanges are
+decided in the parent process (alternating between even and odd neighbor pairs), so the exchanges only depend on the
+exchange random stream. An exchange swaps the temperatures of two replicas rather than their paths, so only the temperatures
+and the current values are passed between processes at each exchange.
+Every replica is annealed (a ladder held at fixed temperatures leaves the coldest replica quenching from its start), and the
+spread between the hottest and coldest replica is kept small so that neighboring replicas exchange often.
+
+OUTPUTS
+bestTour: the best tour of point indices found by any replica
+bestValue: the best total weight found by any replica
+replicaTraces: list with the best value per iteration of each replica (a replica keeps its trace as it moves along the ladder)
+"""
+
+def temperingLadder(weights, neighbors, workers, T, rate, iterations, replicas, exchangeInterval, seeds, moves = "swap", tour = None,
+                    traceSettings = None, spread = 2.0):
+    if traceSettings is None:
+        traceSettings = {"iterations": iterations}
+    ladder = T * spread ** (-np.arange(replicas) / max(replicas - 1, 1)) #Geometric ladder from T down to T / spread
+    exchangeRng = np.random.default_rng(seeds[replicas])
+    held = list(range(replicas)) #Replica held at each position of the ladder
+    groups = [list(range(w, replicas, workers)) for w in range(min(workers, replicas))] #Replicas of each worker process
+
+    with sharedWeights(weights, neighbors) as (specs, pointSettings):
+        connections, processes = [], []
+        try:
+            for group in groups:
+                connection, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target = temperingWorker, daemon = True,
+                                                  args = (child, specs, pointSettings, {k: seeds[k] for k in group},
+                                                          {k: ladder[k] for k in group}, tour, moves, traceSettings))
+                process.start()
+                child.close()
+                connections.append(connection)
+                processes.append(process)
+
+            done = 0
+            rounds = 0
+            while done < iterations:
+                chunk = min(exchangeInterval, iterations - done)
+                temperatures = {held[k]: ladder[k] * rate ** done for k in range(replicas)}
+                for connection, group in zip(connections, groups):
+                    connection.send(({k: temperatures[k] for k in group}, rate, chunk))
+                values = {}
+                for connection in connections:
+                    values.update(connection.recv())
+                done += chunk
+                current = ladder * rate ** done #Temperatures of the ladder at the exchange
+
+                for k in range(rounds % 2, replicas - 1, 2): #Alternating even and odd neighbor pairs
+                    logAccept = (1 / current[k] - 1 / current[k + 1]) * (values[held[k]] - values[held[k + 1]]) #Metropolis exchange, a better path at the hotter rung always moves down
+                    if logAccept >= 0 or math.log(exchangeRng.random()) < logAccept:
+                        held[k], held[k + 1] = held[k + 1], held[k] #Exchanging temperatures, each replica keeps its path and random stream
+                rounds += 1
+
+            results = {}
+            for connection in connections:
+                connection.send(None)
+                results.update(connection.recv())
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for connection in connections:
+                connection.close()
+
+    bestTour, bestValue, _ = min((results[replica] for replica in held), key = lambda result: result[1])
+    replicaTraces = [results[replica][2] for replica in range(replicas)]
+    return bestTour, bestValue, replicaTraces
+
+"""
+iterationSweep is used to measure how the best value converges with the iteration budget, for convergence studies such as
+scenario 2, without rerunning every budget from scratch.
+mode "single": one chain per seed is run for the largest budget, and its best value is taken at every budget on the way,
+so the whole curve costs a single run of the largest budget.
+mode "rescaled": one chain per seed and budget, with the cooling rate rescaled so every budget cools to the same final
+temperature (or an "auto" schedule picked for each budget). This costs the sum of the budgets, but every point of the curve
+is a fully cooled run.
+The seeds are run at the same time across CPU cores, and the spread across seeds gives a confidence band of the mean curve.
+
+INPUTS
+data: the path through which the salesman travels, which is a n by 2 numpy array
+budgets: iteration budgets, such as [10, 100, 1000, 10000, 100000, 1000000]
+T, rate, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType: same as annealOptimization (including "auto"),
+the schedule is fitted to the largest budget
+seeds: number of seeds (independent runs) per budget
+seed: seed used to create an independent random stream for each run
+mode: "single" or "rescaled"
+workers: number of worker processes, defaults to the smaller of seeds and the CPU count
+confidence: confidence level of the band
+moves, neighbors, initial, metric, cacheDirectory: same as annealOptimization
+
+OUTPUT
+sweep: dictionary with the sorted "budgets", the "values" (seeds by budgets numpy array of best values), and the "mean",
+"lower", and "upper" curves of the confidence band
+"""
+
+def sweepWorker(task):
+    T, rate, budgets, seed, moves, tour, mode = task
+    weights = workerArrays["weights"][1]
+    neighbors = workerNeighbors()
+    rng = np.random.default_rng(seed)
+    values = np.zeros(len(budgets))
+    if mode == "single":
+        state = annealState(weights, 1.0, tour, rng)
+        if T == "auto" or rate == "auto":
+            autoT, autoRate = autoSchedule(weights, state["tour"], budgets[-1], moves, neighbors, rng, warm = tour is not None)
+            T = autoT if T == "auto" else T
+            rate = autoRate if rate == "auto" else rate
+        state["T"] = state["T0"] = T
+        draws = RandomBlocks(rng)
+        for k, budget in enumerate(budgets): #Taking the best value of the same chain at each budget
+            annealChain(weights, state, rate, budget - state["iteration"], draws, None, moves = moves, neighbors = neighbors)
+            values[k] = state["bestValue"]
+    else:
+        for k, budget in enumerate(budgets):
+            budgetRate = rate if rate == "auto" else rate ** (budgets[-1] / budget) #Reaching the same final temperature in fewer iterations
+            values[k] = annealCore(weights, T, budgetRate, budget, tour, rng = rng, moves = moves, neighbors = neighbors,
+                                   trace = ConvergenceTrace(budget, mode = "improve"))[1]
+    return values
+
+def iterationSweep(data, budgets, T, rate, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType, seeds = 5, seed = None,
+                   mode = "single", workers = None, confidence = 0.95, moves = "swap", neighbors = 0, initial = None, metric = "planar",
+                   cacheDirectory = None):
+    if mode not in ("single", "rescaled"):
+        raise ValueError("Unknown sweep mode: %s" %mode)
+    budgets = sorted(int(budget) for budget in budgets)
+    coordinates = np.asarray(data)
+    weights = edgeWeights(coordinates, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric, cacheDirectory)
+    streams = np.random.SeedSequence(seed).spawn(seeds + 1) #One stream per run, plus one for the starting tour
+    tour = initialTour(coordinates, initial, np.random.default_rng(streams[seeds])) if isinstance(initial, str) else initial
+    candidates = nearestNeighbors(weights, neighbors) if neighbors else None
+    if workers is None:
+        workers = min(seeds, os.cpu_count() or 1)
+    with sharedPool(weights, candidates, workers) as pool:
+        values = np.array(pool.map(sweepWorker, [(T, rate, budgets, streams[k], moves, tour, mode) for k in range(seeds)]))
+    mean = values.mean(axis = 0)
+    spread = values.std(axis = 0, ddof = 1) / math.sqrt(seeds) if seeds > 1 else np.zeros(len(budgets))
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    return {"budgets": np.array(budgets), "values": values, "mean": mean, "lower": mean - z * spread, "upper": mean + z * spread}
+
+"""
+clusterPoints is used to split the points into spatial clusters for decomposeAnneal.
+"grid": the points are cut into vertical strips with the same number of points, and each strip into cells with the same
+number of points, so every cluster is about the same size however the points are spread.
+"kmeans": k-means clustering (Lloyd's method) from randomly chosen starting centers, with the distances to the centers
+calculated blockSize points at a time. Clusters follow the shape of the data, but their sizes vary.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+clusters: number of clusters
+method: "grid" or "kmeans"
+rng: numpy random Generator (or seed) used to pick the k-means starting centers
+rounds: number of k-means rounds
+
+OUTPUT
+labels: length n integer numpy array with the cluster of each point (empty clusters are left out, so labels run from 0 to
+the number of clusters found minus 1)
+"""
+
+def clusterPoints(data, clusters, method = "grid", rng = None, rounds = 10, blockSize = 4096):
+    points = scaledCoordinates(data)
+    n = len(points)
+    clusters = max(1, min(int(clusters), n))
+    labels = np.zeros(n, dtype = np.int64)
+    if method == "grid":
+        columns = int(math.ceil(math.sqrt(clusters)))
+        rows = int(math.ceil(clusters / columns))
+        label = 0
+        for strip in np.array_split(np.argsort(points[:, 0], kind = "stable"), columns):
+            for cell in np.array_split(strip[np.argsort(points[strip, 1], kind = "stable")], rows):
+                labels[cell] = label
+                label += 1
+    elif method == "kmeans":
+        rng = np.random.default_rng(rng)
+        centers = points[rng.choice(n, clusters, replace = False)]
+        for _ in range(rounds):
+            for start in range(0, n, blockSize):
+                block = points[start:start + blockSize]
+                labels[start:start + blockSize] = np.argmin(((block[:, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2).sum(axis = 2), axis = 1)
+            counts = np.bincount(labels, minlength = clusters)
+            for axis in range(2):
+                sums = np.bincount(labels, weights = points[:, axis], minlength = clusters)
+                centers[counts > 0, axis] = sums[counts > 0] / counts[counts > 0] #Empty clusters keep their old center
+    else:
+        raise ValueError("Unknown clustering method: %s" %method)
+    return np.unique(labels, return_inverse = True)[1].astype(np.int64)
+
+"""
+stitchTours is used to join the cluster tours of decomposeAnneal into one tour. Clusters are visited in the given order,
+and each cluster tour is opened by removing one of its edges: the path enters the cluster at one end of the removed edge,
+goes around the cluster, and leaves from the other end. For every cluster, the edge and direction are chosen to minimize
+the weight of the edge in from the previous cluster, less the weight of the removed edge, plus the weight of the edge out
+to the point of the next cluster closest to this cluster's center.
+
+INPUTS
+weights: n by n numpy array of edge weights of all points, or a PointWeights
+clusterTours: list of cluster tours (arrays of point indices), in the order the clusters are visited
+centers: number of clusters by 2 numpy array of the cluster centers, in the same order
+data: the coordinate points, which is a n by 2 numpy array
+
+OUTPUT
+tour: tour of every point index
+"""
+
+def stitchTours(weights, clusterTours, centers, data):
+    points = scaledCoordinates(data)
+    centers = scaledCoordinates(centers)
+    k = len(clusterTours)
+    closest = lambda members, center: int(members[np.argmin(((points[members] - center) ** 2).sum(axis = 1))])
+    nextPoints = [closest(clusterTours[(c + 1) % k], centers[c]) for c in range(k)] #Where the path is headed after each cluster
+    previous = closest(clusterTours[-1], centers[0])
+    paths = []
+    for c, cycle in enumerate(clusterTours):
+        cycle = np.asarray(cycle)
+        following = np.roll(cycle, -1)
+        removed = weights[cycle, following]
+        fromPrevious = np.full(len(cycle), previous)
+        toNext = np.full(len(cycle), nextPoints[c])
+        forward = weights[fromPrevious, following] - removed + weights[cycle, toNext] #Entering at following[k], leaving from cycle[k]
+        backward = weights[fromPrevious, cycle] - removed + weights[following, toNext] #Entering at cycle[k], leaving from following[k]
+        k = int(np.argmin(np.minimum(forward, backward)))
+        if forward[k] <= backward[k]:
+            path = np.roll(cycle, -(k + 1))
+        else:
+            path = np.roll(cycle[::-1], -(len(cycle) - 1 - k))
+        paths.append(path)
+        previous = int(path[-1])
+    return np.concatenate(paths).astype(np.int32)
+
+"""
+decomposeAnneal is used to solve very large instances, where a single chain over every point converges too slowly.
+The points are split into clusters of about clusterSize points (clusterPoints), and each cluster tour is solved on its own
+with annealCore (or heldKarp for tiny clusters) in a process pool, so the wall time of this step falls almost linearly with
+the number of workers. The clusters are then ordered by a tour over their centers, the cluster tours are opened and joined
+at the cluster boundaries (stitchTours), and a short pass over all points smooths the joins. The refinement runs at the
+fixed temperature refineT, which is 0 by default so only moves that do not make the tour worse are accepted: at a higher
+temperature the uphill moves spread over every point would undo more of the cluster tours than a short pass can repair.
+
+INPUTS
+data: the coordinate points, which is a n by 2 numpy array
+T, rate: schedule of each cluster run, same as annealOptimization (including "auto")
+iterations: iterations of each cluster run
+airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType: same as annealOptimization
+clusterSize: about how many points each cluster holds
+method: "grid" or "kmeans" (see clusterPoints)
+workers: number of worker processes, defaults to the CPU count
+seed: seed of the clustering and of every cluster run
+moves, neighbors: move mix and nearest neighbor count of the cluster runs and the refinement
+refineIterations: iterations of the refinement over all points, 10 per point if none is given (0 skips it)
+refineT: temperature of the refinement
+metric, cacheDirectory: distance metric and distance matrix cache, same as annealOptimization
+
+OUTPUTS
+bestGuess: the best path, which is a n by 2 numpy array
+bestValue: the distance, time, or cost of the best path
+bestPerIter: the best value sampled during the refinement
+"""
+
+def clusterWorker(task):
+    points, settings, T, rate, iterations, moves, neighbors, seed = task
+    weights = edgeWeights(points, settings["airCriteria"], settings["airSpeed"], settings["airCost"], settings["carSpeed"],
+                          settings["carCost"], settings["optimizationType"], settings["metric"])
+    if len(points) <= exactLimit:
+        return heldKarp(weights)[0]
+    rng = np.random.default_rng(seed)
+    return annealCore(weights, T, rate, iterations, initialTour(points, "greedy", rng), rng = rng, moves = moves,
+                      neighbors = neighbors, trace = ConvergenceTrace(iterations, mode = "improve"))[0]
+
+def decomposeAnneal(data, T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType,
+                    clusterSize = 1000, method = "grid", workers = None, seed = None, moves = {"2opt": 0.7, "oropt": 0.3}, neighbors = 8,
+                    refineIterations = None, refineT = 0.0, metric = "planar", cacheDirectory = None):
+    coordinates = np.asarray(data, dtype = float)
+    n = len(coordinates)
+    streams = np.random.SeedSequence(seed).spawn(4) #Clustering, cluster runs, cluster order, and refinement
+    labels = clusterPoints(coordinates, math.ceil(n / clusterSize), method, np.random.default_rng(streams[0]))
+    members = [np.nonzero(labels == c)[0] for c in range(labels.max() + 1)]
+    settings = {"airCriteria": airCriteria, "airSpeed": airSpeed, "airCost": airCost, "carSpeed": carSpeed, "carCost": carCost,
+                "optimizationType": optimizationType, "metric": metric}
+    clusterSeeds = streams[1].spawn(len(members))
+    tasks = [(coordinates[indices], settings, T, rate, iterations, moves, neighbors, clusterSeeds[c]) for c, indices in enumerate(members)]
+    with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        clusterTours = [members[c][tour] for c, tour in enumerate(pool.map(clusterWorker, tasks))]
+
+    centers = np.array([coordinates[indices].mean(axis = 0) for indices in members])
+    if len(members) > 1: #Visiting the clusters in the order of a tour over their centers
+        order = clusterWorker((centers, settings, "auto", "auto", 100 * len(members), moves, neighbors, streams[2]))
+        clusterTours, centers = [clusterTours[c] for c in order], centers[order]
+    weights = edgeWeights(coordinates, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric, cacheDirectory)
+    tour = stitchTours(weights, clusterTours, centers, coordinates)
+
+    refineIterations = 10 * n if refineIterations is None else refineIterations
+    if refineIterations > 0:
+        rng = np.random.default_rng(streams[3])
+        candidates = nearestNeighbors(weights, neighbors) if neighbors else None
+        tour, bestValue, bestPerIter = annealCore(weights, refineT, 1.0, refineIterations, tour, rng = rng, moves = moves,
+                                                  neighbors = candidates, trace = ConvergenceTrace(refineIterations, mode = "log"))
+    else:
+        bestValue = tourLength(tour, weights)
+        bestPerIter = np.array([bestValue])
+    return coordinates[tour], bestValue, bestPerIter
+
+"""
+The following functions update a solved instance when a few of its points change, instead of solving it again from scratch.
+
+updateWeights: weight matrix of the changed points, built from the matrix of the previous points. Only the rows of moved and
+inserted points are calculated (rows times n distances instead of n**2), and the rest is copied. A PointWeights calculates
+its weights on demand, so a new one is simply made for the new points.
+cheapestInsertion: inserts a point into a tour where it adds the least weight, over every edge of the tour at once
+windowAnneal: anneals the path between two fixed ends (a window of a tour). The path is closed into a tour by an edge from
+its last point back to its first with a very low weight, so every good tour of the window keeps that edge and opening it
+there gives the best path between the same ends.
+reoptimizeTour: repairs a previous best tour after the points change, and anneals only around the changes. Deleted points
+are taken out of the tour (joining their neighbors), moved and inserted points are placed by cheapest insertion, and then
+the window of window positions on each side of every changed point is annealed (overlapping windows are merged), so the
+rest of the tour is left as it was.
+
+INPUTS
+data: the previous coordinate points, which is a n by 2 numpy array
+tour: previous best tour of point indices into data
+weights: optional previous weight matrix of data (such as the output of edgeWeights or of a previous reoptimizeTour),
+built from scratch if none is given
+T, rate, iterations: schedule of each window run, same as annealOptimization (including "auto")
+airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType: same as annealOptimization
+inserted: optional m by 2 numpy array of new points
+deleted: optional indices (into data) of points that are no longer visited
+moved: optional dictionary of point index (into data) and its new coordinates
+window: tour positions on each side of a changed point that are annealed
+moves, neighbors: move mix and nearest neighbor count of the window runs
+seed: seed of the window runs
+metric: distance metric, same as annealOptimization
+
+OUTPUTS
+newData: the new coordinate points: the kept points of data in their old order (with moved points at their new
+coordinates), followed by the inserted points
+newTour: best tour of point indices into newData
+newValue: distance, time, or cost of the new tour
+newWeights: weight matrix of newData, which can be passed to the next reoptimizeTour
+"""
+
+def updateWeights(weights, keep, newData, changed, optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric = "planar"):
+    if weights is None or isinstance(weights, PointWeights) or len(newData) > denseLimit:
+        return edgeWeights(newData, airCriteria, airSpeed, airCost, carSpeed, carCost, optimizationType, metric)
+    newWeights = np.empty((len(newData), len(newData)))
+    newWeights[:len(keep), :len(keep)] = weights[np.ix_(keep, keep)]
+    if len(changed):
+        stacked = np.vstack((newData[changed], newData))
+        rows = objectiveWeights(distanceTile(stacked, 0, len(changed), metric)[:, len(changed):], optimizationType,
+                                airCriteria, airSpeed, airCost, carSpeed, carCost)
+        newWeights[changed, :] = rows
+        newWeights[:, changed] = rows.T
+    return newWeights
+
+def cheapestInsertion(tour, point, weights):
+    following = np.roll(tour, -1)
+    added = weights[tour, np.full(len(tour), point)] + weights[np.full(len(tour), point), following] - weights[tour, following]
+    return np.insert(tour, int(np.argmin(added)) + 1, point)
+
+def windowAnneal(weights, path, T, rate, iterations, moves, neighbors, rng):
+    path = np.asarray(path)
+    local = np.array(weights[path[:, np.newaxis], path[np.newaxis, :]], dtype = float)
+    candidates = nearestNeighbors(local, neighbors) if neighbors else None
+    if T == "auto" or rate == "auto": #Picked before the closing edge is added, which would dwarf every sampled move
+        autoT, autoRate = autoSchedule(local, np.arange(len(path)), iterations, moves, candidates, rng, warm = True)
+        T = autoT if T == "auto" else T
+        rate = autoRate if rate == "auto" else rate
+    local[-1, 0] = local[0, -1] = -(np.abs(local).sum() + 1) #Closing edge, lighter than any path between the ends
+    order = annealCore(local, T, rate, iterations, np.arange(len(path), dtype = np.int32), rng = rng, moves = moves,
+                       neighbors = candidates, trace = ConvergenceTrace(iterations, mode = "improve"))[0]
+    order = np.roll(order, -int(np.nonzero(order == 0)[0][0]))
+    if order[-1] != len(path) - 1: #Walking the tour the other way round, so the path still runs from its first to its last point
+        order = np.roll(order[::-1], 1)
+    if order[-1] != len(path) - 1: #The closing edge was not kept, so the path is left as it was
+        return path
+    return path[order]
+
+def reoptimizeTour(data, tour, weights, T, rate, iterations, airSpeed, airCriteria, airCost, carSpeed, carCost, optimizationType,
+                   inserted = None, deleted = None, moved = None, window = 25, moves = {"2opt": 0.7, "oropt": 0.3}, neighbors = 8,
+                   seed = None, metric = "planar"):
+    data = np.asarray(data, dtype = float)
+    moved = moved or {}
+    inserted = np.zeros((0, 2)) if inserted is None else np.asarray(inserted, dtype = float).reshape(-1, 2)
+    kept = np.ones(len(data), dtype = bool)
+    if deleted is not None:
+        kept[np.asarray(deleted, dtype = np.int64)] = False
+    keep = np.nonzero(kept)[0]
+    newIndex = np.full(len(data), -1, dtype = np.int64)
+    newIndex[keep] = np.arange(len(keep))
+    newData = np.vstack((data[keep], inserted))
+    movedIndices = np.array([newIndex[k] for k in moved if kept[k]], dtype = np.int64)
+    for k in moved:
+        if kept[k]:
+            newData[newIndex[k]] = moved[k]
+    changed = np.concatenate((movedIndices, np.arange(len(keep), len(newData)))).astype(np.int64)
+    newWeights = updateWeights(weights, keep, newData, changed, optimizationType, airCriteria, airSpeed, airCost, carSpeed, carCost, metric)
+
+    old = newIndex[np.asarray(tour)]
+    gone = (old < 0) | np.isin(old, movedIndices) #Deleted points, and moved points which are placed again
+    newTour = old[~gone]
+    for point in changed:
+        newTour = cheapestInsertion(newTour, point, newWeights) if len(newTour) >= 2 else np.append(newTour, point)
+    newTour = newTour.astype(np.int32)
+    n = len(newTour)
+    if n <= exactLimit:
+        newTour = heldKarp(newWeights)[0]
+        return newData, newTour, tourLength(newTour, newWeights), newWeights
+
+    pos = np.zeros(len(newData), dtype = np.int64)
+    pos[newTour] = np.arange(n)
+    touched = [pos[point] for point in changed]
+    survivors = np.nonzero(~gone)[0]
+    for k in np.nonzero(gone)[0]: #The joins left where points were taken out
+        touched.append(pos[old[survivors[np.searchsorted(survivors, k) - 1]]])
+    covered = np.zeros(n, dtype = bool)
+    for position in touched:
+        covered[np.arange(position - window, position + window + 1) % n] = True
+    rng = np.random.default_rng(seed)
+    if covered.all():
+        newTour = annealCore(newWeights, T, rate, iterations, newTour, rng = rng, moves = moves, neighbors = neighbors,
+                             trace = ConvergenceTrace(iterations, mode = "improve"))[0]
+    elif covered.any():
+        start = int(np.argmin(covered)) #Rotating the tour so no window wraps around its end
+        newTour, covered = np.roll(newTour, -start), np.roll(covered, -start)
+        edges = np.diff(np.append(covered, False).astype(np.int8))
+        for first, last in zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]):
+            lo, hi = first, min(last + 2, n) #The window, with an untouched point on each side as its fixed ends
+            if hi - lo >= 5:
+                newTour[lo:hi] = windowAnneal(newWeights, newTour[lo:hi], T, rate, iterations, moves, neighbors, rng)
+    return newData, newTour, tourLength(newTour, newWeights), newWeights
+
+"""
+The following functions draw the result figures. matplotlib is only imported when a figure is drawn, so the solver can be
+imported and run without it. A figure is described by a small dictionary (built by pathFigure or lineFigure), so that
+completed results can be handed to a background process (renderInBackground) which draws and saves every figure headless,
+without opening windows or holding up the optimization.
+
+pathFigure: figure of a path through the points, lineColor is the color of the path line and title is the title of the graph
+(the file is named after the title)
+lineFigure: figure of one or more lines, series is a list of (values, label) pairs (label can be None), x is optional, and band
+is an optional (lower, upper) pair shaded around the lines
+drawFigure: draws a figure description on the current matplotlib figure
+"""
+
+def loadPyplot(headless = False):
+    import matplotlib
+    if headless:
+        matplotlib.use("Agg") #Drawing to files only, no display is needed
+    import matplotlib.pyplot as plt
+    return plt
+
+def pathFigure(data, lineColor, title):
+    return {"kind": "path", "data": np.asarray(data), "color": lineColor, "title": title, "file": "%s.png" %title}
+
+def lineFigure(series, xlabel, ylabel, title, fileName, x = None, loglog = False, band = None):
+    return {"kind": "line", "series": [(np.asarray(values), label) for values, label in series], "x": x,
+            "xlabel": xlabel, "ylabel": ylabel, "title": title, "file": fileName, "loglog": loglog, "band": band}
+
+def drawFigure(plt, figure):
+    if figure["kind"] == "path":
+        data = figure["data"]
+        dataLoop = np.vstack((data, data[0,:])) #In order for the full path to be graphed, the first data row must be put on the bottom of the data
+        #In order for the path grapher to fully loop back to the initial value, the first row must be copied to the bottom
+        x = dataLoop[:,0] #Extracting x and y data from the fully looped data
+        y = dataLoop[:,1]
+        plt.plot(x,y,alpha = 0.8,color=figure["color"], label = "Optimized Path")
+        plt.scatter(x,y, marker = ".", color="black", alpha = 1, label = "State Capitals")
+        plt.plot(x[0], y[0], marker = "^",markersize = 10, color="orange", label = "Starting State Capital") #Starting city is denoted with special marker
+        plt.xlabel("Latitude (deg.)")
+        plt.ylabel("Longitude (deg.)")
+        plt.legend()
+    else:
+        plot = plt.loglog if figure["loglog"] else plt.plot
+        for values, label in figure["series"]:
+            if figure["x"] is not None:
+                plot(figure["x"], values, label = label)
+            else:
+                plot(values, label = label)
+        if figure.get("band") is not None:
+            lower, upper = figure["band"]
+            x = figure["x"] if figure["x"] is not None else np.arange(len(lower))
+            plt.fill_between(x, lower, upper, alpha = 0.3)
+        plt.xlabel(figure["xlabel"])
+        plt.ylabel(figure["ylabel"])
+        if any(label is not None for _, label in figure["series"]):
+            plt.legend()
+    plt.title(figure["title"])
 
 """
 pathGrapher is used to plot optimal path determiend by Simulated Annealing method. 
 Multiple parameters are input to determine visual characteristics.
+The graph is saved and then shown in a window (see renderInBackground to save graphs without showing them).
 
 INPUTS
 data: the path through which the salesman travels, which is a n by 2 numpy array
@@ -304,20 +3035,55 @@ NONE
 """
 
 def pathGrapher(data, lineColor, title):
-    dataLoop = np.vstack((data, data[0,:])) #In order for the full path to be graphed, the first data row must be put on the bottom of the data
-    #In order for the path grapher to fully loop back to the initial value, the first row must be copied to the bottom
-    x = dataLoop[:,0] #Extracting x and y data from the fully looped data
-    y = dataLoop[:,1]
-    plt.plot(x,y,alpha = 0.8,color=lineColor, label = "Optimized Path")
-    plt.scatter(x,y, marker = ".", color="black", alpha = 1, label = "State Capitals")
-    plt.plot(x[0], y[0], marker = "^",markersize = 10, color="orange", label = "Starting State Capital") #Starting city is denoted with special marker
-    plt.xlabel("Latitude (deg.)")
-    plt.ylabel("Longitude (deg.)")
-    plt.legend()
-    plt.title(title)
-    plt.savefig("%s.png" %title, bbox_inches = "tight")
+    plt = loadPyplot()
+    figure = pathFigure(data, lineColor, title)
+    drawFigure(plt, figure)
+    plt.savefig(figure["file"], bbox_inches = "tight")
     plt.show()
 
+"""
+renderFigures is used to draw and save a batch of figures headless (with the Agg backend). 
+renderInBackground runs renderFigures in a separate worker process and returns right away, and finishRendering waits for every
+batch handed to the background worker to be written.
+
+INPUTS
+figures: list of figure descriptions (from pathFigure and lineFigure)
+directory: folder the figures are saved in
+
+OUTPUTS
+files: list of saved files (renderFigures and finishRendering)
+job: concurrent.futures Future of the batch (renderInBackground)
+"""
+
+renderExecutor = None #Background worker process, started by the first renderInBackground call
+renderJobs = []
+
+def renderFigures(figures, directory = "plots"):
+    plt = loadPyplot(headless = True)
+    os.makedirs(directory, exist_ok = True)
+    files = []
+    for figure in figures:
+        handle = plt.figure()
+        drawFigure(plt, figure)
+        files.append(os.path.join(directory, figure["file"]))
+        plt.savefig(files[-1], bbox_inches = "tight")
+        plt.close(handle)
+    return files
+
+def renderInBackground(figures, directory = "plots"):
+    global renderExecutor
+    if renderExecutor is None:
+        renderExecutor = concurrent.futures.ProcessPoolExecutor(max_workers = 1)
+    job = renderExecutor.submit(renderFigures, list(figures), directory)
+    renderJobs.append(job)
+    return job
+
+def finishRendering():
+    files = []
+    while renderJobs:
+        files.extend(renderJobs.pop(0).result())
+    return files
+
 """
 main function which contains three scenarios, with all values already preset.
 
@@ -330,14 +3096,16 @@ each iteration compared to the final best distance, time, and cost.
 
 SCENARIO 2: Testing Convergence over Iteration Count 
 
-This scenario considers the convergence of the Simulated Annealing algorithm over many iterations.
+This scenario considers the convergence of the Simulated Annealing algorithm over many iterations. The mean best distance over
+several seeds is plotted against the iteration number, with a shaded 95% confidence band.
 
 SCENARIO 3: Circle Traveling
 
 This scenario considers travel across a circle. Starting from a random point along the circle, paths that optimize distance, time, and cost 
 are generated and plotted along with the exact order of cities, and the total distance, time, and cost are printed. All important outputs, 
 such as total distance, time, and cost are also printed. Compared to SCENARIO 1, SCENARIO 3 exaggerates the effect of which quantity is best optimized,
-which is illustrated by the distinct changes in optimal path. 
+which is illustrated by the distinct changes in optimal path. With only 20 points, the paths are solved exactly with heldKarp
+rather than annealed, so they are the true optimal paths.
 
 SCENARIO 4: City Traveling
 
@@ -370,58 +3138,9 @@ if __name__ == "__main__":
     carSpeed1 = 60 #mph
     carCost1 = 1 #dollars
     
-    #Latitude Longitude Points of all US State Capitals
-    data1 = np.array([
-    (32.377716, -86.300568),
-    (58.301598, -134.420212),
-    (33.448143, -112.096962),
-    (34.746613, -92.288986),
-    (38.576668, -121.493629),
-    (39.739227, -104.984856),
-    (41.764046, -72.682198),
-    (39.157307, -75.519722),
-    (21.307442, -157.857376),
-    (30.438118, -84.281296),
-    (33.749027, -84.388229),
-    (43.617775, -116.199722),
-    (39.798363, -89.654961),
-    (39.768623, -86.162643),
-    (41.591087, -93.603729),
-    (39.048191, -95.677956),
-    (38.186722, -84.875374),
-    (30.457069, -91.187393),
-    (44.307167, -69.781693),
-    (38.978764, -76.490936),
-    (42.358162, -71.063698),
-    (42.733635, -84.555328),
-    (44.955097, -93.102211),
-    (32.303848, -90.182106),
-    (38.579201, -92.172935),
-    (46.585709, -112.018417),
-    (40.808075, -96.699654),
-    (39.163914, -119.766121),
-    (43.206898, -71.537994),
-    (40.220596, -74.769913),
-    (35.68224, -105.939728),
-    (35.78043, -78.639099),
-    (46.82085, -100.783318),
-    (42.652843, -73.757874),
-    (39.961346, -82.999069),
-    (35.492207, -97.503342),
-    (44.938461, -123.030403),
-    (40.264378, -76.883598),
-    (41.830914, -71.414963),
-    (34.000343, -81.033211),
-    (44.367031, -100.346405),
-    (36.16581, -86.784241),
-    (30.27467, -97.740349),
-    (40.777477, -111.888237),
-    (44.262436, -72.580536),
-    (37.538857, -77.43364),
-    (47.035805, -122.905014),
-    (38.336246, -81.612328),
-    (43.074684, -89.384445),
-    (41.140259, -104.820236)])
+    #Latitude Longitude Points of all US State Capitals, with the state of each capital in names1
+    data1, names1 = loadCoordinates(os.path.join(os.path.dirname(os.path.abspath(__file__)), "us-state-capitals.csv"))
+    metric1 = "haversine" #Great circle distances, since the capitals span from Honolulu to Juneau
     
     #######################################################################################
     
@@ -435,12 +3154,11 @@ if __name__ == "__main__":
     carSpeed2 = 60 #mph
     carCost2 = 1 #dollars
 
-    iterationRange = np.array([10,100,1000,10000,100000])#,1000000]) 
+    iterationRange = np.array([10,100,1000,10000,100000,1000000])
+    seeds2 = 5 #Independent runs used for the confidence band
 
-    #There is significant computation needed past 100000 iterations
-    # However, one can extend the iteration range if desired, 
-    # though temperature and rate will need to be increased in order to 
-    # prevent floating point error 
+    #Every budget is read off the same chain (see iterationSweep), so the whole range costs one run of the largest budget per seed.
+    # The seeds run at the same time across CPU cores.
 
     #######################################################################################
 
@@ -482,7 +3200,7 @@ if __name__ == "__main__":
     n = 500
 
     # Generate random points
-    data4 = np.array([(random.uniform(0, squareSize), random.uniform(0, squareSize)) for point in range(n)])
+    data4 = np.random.default_rng().uniform(0, squareSize, (n, 2))
 
     # Print the first 10 points as an example
 
@@ -491,9 +3209,13 @@ if __name__ == "__main__":
         print("SIMULATION RUNNING")
 
         #Performing optimization based on distance, time, and cost
-        bestPath, bestDistance,bestDistancePerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "distance")
-        bestTimePath, bestTime, bestTimePerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "time")
-        bestCostPath, bestCost, bestCostPerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "cost")
+        #Each finished path is handed to the background renderer right away, so plotting never holds up the next optimization
+        bestPath, bestDistance,bestDistancePerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "distance", metric = metric1, cacheDirectory = ".salesman_cache")
+        renderInBackground([pathFigure(bestPath, "red", "Optimal Distance Path: Scenario 1")])
+        bestTimePath, bestTime, bestTimePerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "time", metric = metric1, cacheDirectory = ".salesman_cache")
+        renderInBackground([pathFigure(bestTimePath, "green", "Optimal Time Path: Scenario 1")])
+        bestCostPath, bestCost, bestCostPerIter = annealOptimization(data1,T,rate,iterations,airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "cost", metric = metric1, cacheDirectory = ".salesman_cache")
+        renderInBackground([pathFigure(bestCostPath, "blue", "Optimal Cost Path: Scenario 1")])
         
         #Calculating optimization performance per iteration relative to final best optimized values
         relPerformDist = bestDistance/bestDistancePerIter
@@ -506,71 +3228,42 @@ if __name__ == "__main__":
         print("Optimal Time:", bestTime, "Hr")
         print("Optimal Cost:", bestCost, "USD")
 
-        #The following graphs plot the final optimal paths
-
-        pathGrapher(bestPath, "red", "Optimal Distance Path: Scenario 1")
-        pathGrapher(bestTimePath, "green", "Optimal Time Path: Scenario 1")
-        pathGrapher(bestCostPath, "blue", "Optimal Cost Path: Scenario 1")
-
-        #The following graphs plot the best distance per iteration
-
-        plt.plot(bestDistancePerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Distance (mi)")
-        plt.title("Simulated Annealing Distance Performance over Iteration: Scenario 1")
-        plt.savefig("cost iteration: scenario 1.png", bbox_inches = "tight")
-        plt.show()
-        
-
-        plt.plot(bestTimePerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Time (Hr)")
-        plt.title("Simulated Annealing Time Performance over Iteration: Scenario 1")
-        plt.savefig("time iteration: scenario 1.png", bbox_inches = "tight")
-        plt.show()
-
-        plt.plot(bestCostPerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Cost (USD)")
-        plt.title("Simulated Annealing Cost Performance over Iteration: Scenario 1")
-        plt.savefig("cost iteration: scenario 1.png", bbox_inches = "tight")
-        plt.show()
-
-        plt.plot(relPerformDist, label = "Distance")
-        plt.plot(relPerformCost, label = "Cost")
-        plt.plot(relPerformTime, label = "Time")
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Relative Performance (%)")
-        plt.title("Relative Performance of Different Optimizations Compared to Final Optimal Value: Scenario 1")
-        plt.legend()
-        plt.savefig("rel performance: scenario 1.png", bbox_inches = "tight")
-        plt.show()        
+        #The following graphs plot the best distance, time, and cost per iteration
+
+        renderInBackground([
+            lineFigure([(bestDistancePerIter, None)], "Iteration Count", "Total Distance (mi)",
+                       "Simulated Annealing Distance Performance over Iteration: Scenario 1", "distance iteration: scenario 1.png"),
+            lineFigure([(bestTimePerIter, None)], "Iteration Count", "Total Time (Hr)",
+                       "Simulated Annealing Time Performance over Iteration: Scenario 1", "time iteration: scenario 1.png"),
+            lineFigure([(bestCostPerIter, None)], "Iteration Count", "Total Cost (USD)",
+                       "Simulated Annealing Cost Performance over Iteration: Scenario 1", "cost iteration: scenario 1.png"),
+            lineFigure([(relPerformDist, "Distance"), (relPerformCost, "Cost"), (relPerformTime, "Time")], "Iteration Count", "Relative Performance (%)",
+                       "Relative Performance of Different Optimizations Compared to Final Optimal Value: Scenario 1", "rel performance: scenario 1.png")])
     
     elif scenario2:
 
-        bestDistancesTotal = np.zeros(len(iterationRange))
+        #Performing optimization based on distance, with the best distance taken at every iteration budget
+        sweep = iterationSweep(data1, iterationRange, T, rate, airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "distance", seeds = seeds2,
+                               metric = metric1, cacheDirectory = ".salesman_cache")
         for i in range(0,len(iterationRange)):
-            #Performing optimization based on distance
-            bestPath, bestDistance,bestDistancePerRun = annealOptimization(data1,T,rate,iterationRange[i],airSpeed1, airCriteria1, airCost1, carSpeed1, carCost1, "distance")
-            bestDistancesTotal[i] = bestDistance
-            print("N = %f Cycle Complete" %iterationRange[i])
+            print("N = %d: mean best distance %f (%f to %f)" %(iterationRange[i], sweep["mean"][i], sweep["lower"][i], sweep["upper"][i]))
         
-        plt.loglog(iterationRange,bestDistancesTotal)
-        plt.xlabel("Iteration Number")
-        plt.ylabel("Best Distance (mi)")
-        plt.title("Relationship between Best Distance and Iteration Number")
-        plt.savefig("iterationConvergence.png",bbox_inches = 'tight')
-        plt.show()
+        renderInBackground([lineFigure([(sweep["mean"], None)], "Iteration Number", "Best Distance (mi)",
+                                       "Relationship between Best Distance and Iteration Number", "iterationConvergence.png",
+                                       x = iterationRange, loglog = True, band = (sweep["lower"], sweep["upper"]))])
 
     elif scenario3:
 
         print("SIMULATION RUNNING")
 
-        #Performing optimization based on distance, time, and cost
+        #Performing optimization based on distance, time, and cost, solved exactly since the circle only has 20 points
 
-        bestPath, bestDistance,bestDistancePerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "distance")
-        bestTimePath, bestTime, bestTimePerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "time")
-        bestCostPath, bestCost, bestCostPerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "cost")
+        bestPath, bestDistance,bestDistancePerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "distance", exact = True)
+        renderInBackground([pathFigure(bestPath, "red", "Optimal Distance Path: Scenario 3")])
+        bestTimePath, bestTime, bestTimePerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "time", exact = True)
+        renderInBackground([pathFigure(bestTimePath, "green", "Optimal Time Path: Scenario 3")])
+        bestCostPath, bestCost, bestCostPerIter = annealOptimization(data3,T,rate,iterations,airSpeed3, airCriteria3, airCost3, carSpeed3, carCost3, "cost", exact = True)
+        renderInBackground([pathFigure(bestCostPath, "blue", "Optimal Cost Path: Scenario 3")])
 
         print("SIMULATION RESULTS:")
 
@@ -578,17 +3271,16 @@ if __name__ == "__main__":
         print("Optimal Time:", bestTime, "Hr")
         print("Optimal Cost:", bestCost, "USD")
 
-        pathGrapher(bestPath, "red", "Optimal Distance Path: Scenario 3")
-        pathGrapher(bestTimePath, "green", "Optimal Time Path: Scenario 3")
-        pathGrapher(bestCostPath, "blue", "Optimal Cost Path: Scenario 3")   
-
     elif scenario4:
         print("SIMULATION RUNNING")
 
         #Performing optimization based on distance, time, and cost
         bestPath, bestDistance,bestDistancePerIter = annealOptimization(data4,T,rate,iterations,airSpeed4, airCriteria4, airCost4, carSpeed4, carCost4, "distance")
+        renderInBackground([pathFigure(bestPath, "red", "Optimal Distance Path: Scenario 4")])
         bestTimePath, bestTime, bestTimePerIter = annealOptimization(data4,T,rate,iterations,airSpeed4, airCriteria4, airCost4, carSpeed4, carCost4, "time")
+        renderInBackground([pathFigure(bestTimePath, "green", "Optimal Time Path: Scenario 4")])
         bestCostPath, bestCost, bestCostPerIter = annealOptimization(data4,T,rate,iterations,airSpeed4, airCriteria4, airCost4, carSpeed4, carCost4, "cost")
+        renderInBackground([pathFigure(bestCostPath, "blue", "Optimal Cost Path: Scenario 4")])
         
         #Calculating optimization performance per iteration relative to final best optimized values
         relPerformDist = bestDistance/bestDistancePerIter
@@ -601,41 +3293,18 @@ if __name__ == "__main__":
         print("Optimal Time:", bestTime, "Hr")
         print("Optimal Cost:", bestCost, "USD")
 
-        #The following graphs plot the final optimal paths
-
-        pathGrapher(bestPath, "red", "Optimal Distance Path: Scenario 4")
-        pathGrapher(bestTimePath, "green", "Optimal Time Path: Scenario 4")
-        pathGrapher(bestCostPath, "blue", "Optimal Cost Path: Scenario 4")
-
-        #The following graphs plot the best distance per iteration
-
-        plt.plot(bestDistancePerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Distance (mi)")
-        plt.title("Simulated Annealing Disance Performance over Iteration")
-        plt.savefig("distance iteration: scenario 4.png", bbox_inches = "tight")
-        plt.show()
-
-        plt.plot(bestTimePerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Time (Hr)")
-        plt.title("Simulated Annealing Time Performance over Iteration")
-        plt.savefig("time iteration: scenario 4.png", bbox_inches = "tight")
-        plt.show()
-
-        plt.plot(bestCostPerIter)
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Total Cost (USD)")
-        plt.title("Simulated Annealing Cost Performance over Iteration")
-        plt.savefig("cost iteration: scenario 4.png", bbox_inches = "tight")
-        plt.show()
-
-        plt.plot(relPerformDist, label = "Distance")
-        plt.plot(relPerformCost, label = "Cost")
-        plt.plot(relPerformTime, label = "Time")
-        plt.xlabel("Iteration Count")
-        plt.ylabel("Relative Performance (%)")
-        plt.title("Relative Performance of Different Optimization Compared to Final Optimal Value")
-        plt.legend()
-        plt.savefig("rel performance: scenario 4.png", bbox_inches = "tight")
-        plt.show()
\ No newline at end of file
+        #The following graphs plot the best distance, time, and cost per iteration
+
+        renderInBackground([
+            lineFigure([(bestDistancePerIter, None)], "Iteration Count", "Total Distance (mi)",
+                       "Simulated Annealing Disance Performance over Iteration", "distance iteration: scenario 4.png"),
+            lineFigure([(bestTimePerIter, None)], "Iteration Count", "Total Time (Hr)",
+                       "Simulated Annealing Time Performance over Iteration", "time iteration: scenario 4.png"),
+            lineFigure([(bestCostPerIter, None)], "Iteration Count", "Total Cost (USD)",
+                       "Simulated Annealing Cost Performance over Iteration", "cost iteration: scenario 4.png"),
+            lineFigure([(relPerformDist, "Distance"), (relPerformCost, "Cost"), (relPerformTime, "Time")], "Iteration Count", "Relative Performance (%)",
+                       "Relative Performance of Different Optimization Compared to Final Optimal Value", "rel performance: scenario 4.png")])
+
+    #Waiting for the background renderer to finish writing every graph to the plots folder
+    for file in finishRendering():
+        print("Saved", file)